@@ -0,0 +1,3438 @@
+"""
+Generate Graphs Directly in the (ASCII- or Unicode-based) Terminal
+
+Everything distribution.py does is in here, that script being just the way in:
+a module gets cached compiled by Python where a script gets compiled every run.
+
+If you find yourself typing:
+  [long | list | of | commands | sort | uniq -c | sort -rn]
+
+Replace:
+  [| sort | uniq -c | sort -rn]
+
+With:
+  [| distribution]
+
+Then bask in the glory of your new-found data visualization. There are other
+use cases as well.
+"""
+
+import bisect
+import copy
+import heapq
+import io
+import math
+import mmap
+import os
+import select
+import struct
+import sys
+import time
+from array import array
+from collections import Counter, deque
+from itertools import accumulate, chain, islice
+from operator import itemgetter, methodcaller
+
+
+class Histogram:
+    """
+    Takes the tokenDict built in the InputReader class and goes through it,
+    printing a histogram for each of the highest height entries
+    """
+
+    def __init__(self):
+        # every bar histogram_bar can return for the chars and width in use,
+        # indexed by its width in partial chars (in full-width chars, unless
+        # --char is pb or pl)
+        self.barsKey = None
+        self.bars = []
+        self.steps = 1
+        self.zeroChar = ""
+
+    def build_bars(self, s, histWidth):
+        # first case is partial-width chars
+        oneChar = ""
+        if s.charWidth < 1:
+            zeroChar = s.graphChars[-1]
+        elif len(s.histogramChar) > 1 and not s.unicodeMode:
+            zeroChar = s.histogramChar[0]
+            oneChar = s.histogramChar[1]
+        else:
+            zeroChar = s.histogramChar
+            oneChar = s.histogramChar
+
+        # we always have at least one remaining char for histogram - if
+        # we have full-width chars, then it's part of the bar, otherwise the
+        # partial char depends on the remainder: a bar for each of them
+        # FIXME: The remainder partial char printed does not take into
+        # account logarithmic scale (can humans notice?).
+        steps = len(s.graphChars) if s.charWidth < 1 else 1
+        partials = [""] + s.graphChars[1:steps]
+        self.zeroChar = zeroChar
+        self.steps = steps
+        self.bars = [
+            zeroChar * n + oneChar + partial
+            for n in range(max(histWidth, 0) + 1)
+            for partial in partials
+        ]
+        self.barsKey = (s.histogramChar, s.charWidth, s.unicodeMode, histWidth)
+
+    def plan_bars(self, s, histWidth, maxVal):
+        # a function giving the bar for a value, with everything that's the
+        # same for every bar of a frame (the table of bars, the scale, the
+        # log of maxVal) worked out once up front
+        if self.barsKey != (s.histogramChar, s.charWidth, s.unicodeMode, histWidth):
+            self.build_bars(s, histWidth)
+        bars = self.bars
+        steps = self.steps
+        zeroChar = self.zeroChar
+        log = math.log
+
+        if s.logarithmic:
+            # a max of 1 has a log of 0, every bar then being empty
+            maxLog = log(maxVal) or 1
+
+            def bar_width(barVal):
+                return (log(barVal) if barVal > 0 else 0) / maxLog * histWidth
+
+        else:
+
+            def bar_width(barVal):
+                return barVal / maxVal * histWidth
+
+        def bar(barVal):
+            width = int(bar_width(barVal) * steps)
+            if width < 0:
+                return bars[0]
+            if width < len(bars):
+                return bars[width]
+            # past maxVal: the whole of it in full-width chars
+            return zeroChar * (width // steps) + bars[width % steps]
+
+        return bar
+
+    def histogram_bar(self, s, histWidth, maxVal, barVal):
+        # given a value and max, return string for histogram bar of the proper
+        # number of characters, including unicode partial-width characters
+        return self.plan_bars(s, histWidth, maxVal)(barVal)
+
+    def write_hist(
+        self, s, tokenDict, errorDict=None, topKeys=None, out=None, err=None
+    ):
+        # topKeys, if given, are the highest-counted keys in histogram order,
+        # saving us from finding them. the histogram goes to stdout and the
+        # header and stats to stderr unless other streams are given
+        if out is None:
+            out = sys.stdout
+        if err is None:
+            err = sys.stderr
+
+        maxTokenLen = 0
+        outputDict = {}
+
+        numItems = 0
+        maxVal = 0
+        # decayed counts are stored scaled up, see ExponentialDecay
+        countScale = s.countScale
+        totalValues = s.totalValues * countScale
+
+        outputErrors = {}
+        if topKeys is None:
+            # one more than we need, in case the empty key is among them
+            topKeys = top_keys(tokenDict, s.height + 1)
+        # Space-Saving's error bounds are always shown, a sample's only with -v
+        counterErrors = errorDict is not None
+        if s.linesSampled and (s.verbose or counterErrors):
+            # a sampled key's count is binomial, ±Err being the 95% confidence
+            # interval of the count it's scaled up to - on top of how much
+            # Space-Saving may have overcounted it by, if that's the counter
+            fraction = s.linesSampled / s.linesSeen
+            overcounts = errorDict or {}
+            errorDict = {
+                k: overcounts.get(k, 0)
+                + 1.96 * math.sqrt(tokenDict[k] * (1 - fraction))
+                for k in topKeys
+            }
+        for k in topKeys:
+            # can't remember what feature "if k:" adds - i think there's an
+            # off-by-one death the script sometimes suffers without it.
+            if k:
+                # whole-line input is counted as raw bytes, decode only the
+                # keys that actually get shown. utf-8 bytes sort in the same
+                # order as the decoded strings, so ties come out the same
+                key = k
+                if isinstance(k, bytes):
+                    key = k.decode(s.encoding, "backslashreplace")
+                count = outputDict[key] = tokenDict[k] * countScale
+                if errorDict is not None:
+                    outputErrors[key] = errorDict.get(k, 0) * countScale
+                maxTokenLen = max(maxTokenLen, len(str(key)))
+                if count > maxVal:
+                    maxVal = count
+                numItems += 1
+                if numItems >= s.height:
+                    break
+
+        s.endTime = int(time.time() * 1000)
+        totalMillis = s.endTime - s.startTime
+        if s.verbose:
+            # sampled input is shown scaled up to the whole of it, like the counts
+            examined = s.totalObjects * s.sampleScale
+            err.write(f"tokens/lines examined: {format_count(examined, ',')}\n")
+            err.write(f" tokens/lines matched: {format_count(totalValues, ',')}\n")
+            # a compact key store only names the keys at the top
+            keyStore = s.keyStore
+            numKeys = len(tokenDict) if keyStore is None else keyStore.numKeys
+            err.write(f"       histogram keys: {numKeys:,d}\n")
+            if keyStore is not None:
+                bytesPerKey = keyStore.memory() / max(numKeys, 1)
+                err.write(f"        bytes per key: {bytesPerKey:,.1f}\n")
+            # once keys have been dropped, that's no longer how many there were
+            dropped = s.numPrunes or errorDict is not None or s.window
+            if s.distinct is not None and (dropped or s.mergeStates):
+                err.write(
+                    f"  distinct keys (est): {s.distinct.estimate():,.0f} "
+                    f"(±{s.distinct.error() * 100:.1f}%)\n"
+                )
+            if s.sampleRate or s.reservoirSize:
+                sampled = s.linesSampled / max(s.linesSeen, 1) * 100
+                err.write(
+                    f"        lines sampled: {s.linesSampled:,d} of {s.linesSeen:,d}"
+                    f" ({sampled:.2f}%), counts scaled up {format_count(s.sampleScale)}"
+                    "x, ±Err is a 95% confidence interval"
+                    + (" plus the Space-Saving bound\n" if counterErrors else "\n")
+                )
+            if s.memoryBudget:
+                err.write(
+                    f"   memory (est, peak): {format_size(s.memoryPeak)}"
+                    f" of {format_size(s.memoryBudget)}\n"
+                )
+                if s.prunePauses:
+                    err.write(
+                        f"         prune pauses: {len(s.prunePauses):,d}, longest"
+                        f" {max(s.prunePauses) * 1000:,.2f}ms,"
+                        f" total {sum(s.prunePauses) * 1000:,.2f}ms\n"
+                    )
+            if errorDict is not None:
+                maxError = max(errorDict.values(), default=0) * countScale
+                err.write(f"      max count error: {format_count(maxError, ',')}\n")
+            err.write(f"              runtime: {totalMillis:,.2f}ms\n")
+
+        if not outputDict:
+            return
+
+        # the render plan for the frame: the first entry, the largest,
+        # determines the column widths
+        firstCount = next(iter(outputDict.values()))
+        maxValueWidth = len(format_count(firstCount))
+        maxPctWidth = len(f"({firstCount / totalValues * 100:2.2f}%)")
+        maxErrWidth = 0
+        errStrings = {}
+        if errorDict is not None:
+            # an error bound is never larger than its count, but a confidence
+            # interval may have decimal places where the counts have none
+            errStrings = {k: f"±{format_count(e)}" for k, e in outputErrors.items()}
+            maxErrWidth = max(maxValueWidth + 1, *map(len, errStrings.values())) + 1
+
+        # we always output a single histogram char at the end, so
+        # we output one less than actual number here
+        histWidth = (
+            s.width
+            - (maxTokenLen + 1)
+            - (maxValueWidth + 1)
+            - maxErrWidth
+            - (maxPctWidth + 1)
+            - 1
+        )
+
+        # output a header, and get ready for the output - sorting gets
+        # hosed if we print the colour code before the key, so put it
+        # on the line before
+        header = (
+            "Key".rjust(maxTokenLen)
+            + "|"
+            + "Ct".ljust(maxValueWidth)
+            + " "
+            + ("±Err".ljust(maxErrWidth) if errorDict is not None else "")
+            + "(Pct)".ljust(maxPctWidth)
+            + " "
+            + "Histogram"
+            + s.keyColour
+            + "\n"
+        )
+
+        # every row is then one format of this, the widths and colours being
+        # the same for all of them. we do these antics of printing keyColour
+        # on the line before the key so that piping output to sort will work
+        bar = self.plan_bars(s, histWidth, maxVal)
+        rowFormat = (
+            f"{{:>{maxTokenLen}}}{s.regularColour}|{s.ctColour}"
+            f"{{:>{maxValueWidth}}} {{:<{maxErrWidth}}}{s.pctColour}"
+            f"{{:>{maxPctWidth}}} {s.graphColour}{{}}{s.keyColour}\n"
+        ).format
+        rows = []
+        for k, count in outputDict.items():
+            pct = f"({count / totalValues * 100:2.2f}%)"
+            outErr = errStrings.get(k, "")
+            rows.append(rowFormat(str(k), format_count(count), outErr, pct, bar(count)))
+        # put the terminal back into a normal-colour mode on the last entry
+        rows[-1] = rows[-1][: -len(s.keyColour) - 1] + s.regularColour + "\n"
+
+        # the whole histogram goes out in one write
+        err.write(header)
+        out.write("".join(rows))
+
+    def write_numerics(
+        self, s, values, maxVal, maxWidth, sumVal, rowMaxes=None, clampWidth=False
+    ):
+        # simple graphical output for --numonly, a row per value. rows are
+        # built up and written out in large slices rather than piece by piece.
+        # with rowMaxes (--rolling-max), each row is scaled to, and shown as a
+        # percentage of, its own max instead of maxVal and sumVal. with
+        # clampWidth, values too wide for maxWidth (3 at least) are shown as
+        # the most that fits, eg >99 or <-9, and percentages lose decimals
+        # to leave a space before them, those past 100 either way being shown
+        # as >100 or <-100
+        histWidth = s.width - 11 - maxWidth
+        sumVal = float(sumVal)
+        rowFormat = (
+            f"{s.keyColour}{{:>{maxWidth}}}{s.pctColour}{{:>9}} "
+            f"{s.graphColour}{{}}\n{s.regularColour}"
+        ).format
+        bar = self.plan_bars(s, histWidth, maxVal)
+
+        # plain full-width bars can be looked up straight from the table the
+        # plan draws them from, skipping a call per row
+        lookupBars = not s.logarithmic and s.charWidth == 1 and histWidth >= 0
+        if rowMaxes is not None:
+            lookupBars = False
+        bars = self.bars
+        tooHigh = 10**maxWidth
+        tooLow = -(10 ** (maxWidth - 1))
+
+        rows = []
+        for n, k in enumerate(values):
+            if rowMaxes is not None:
+                maxVal = sumVal = rowMaxes[n] if rowMaxes[n] > 0 else 1.0
+                bar = self.plan_bars(s, histWidth, maxVal)
+            pct = k / sumVal * 100
+            if not clampWidth:
+                pct = f"({pct:2.2f}%)"
+            elif pct > 100:
+                pct = "(>100%)"
+            elif pct < -100:
+                pct = "(<-100%)"
+            else:
+                for places in (2, 1, 0):
+                    text = f"({pct:.{places}f}%)"
+                    if len(text) < 9:
+                        break
+                pct = text
+            key = int(k)
+            if clampWidth and not tooLow < key < tooHigh:
+                if key > 0:
+                    key = ">" + "9" * (maxWidth - 1)
+                else:
+                    key = "<-" + "9" * (maxWidth - 2)
+            if lookupBars and 0 <= k <= maxVal:
+                rows.append(rowFormat(key, pct, bars[int(k / maxVal * histWidth)]))
+            else:
+                # values past a fixed --max are drawn as full-width bars
+                # rather than running off the edge of the terminal
+                rows.append(rowFormat(key, pct, bar(min(k, maxVal))))
+            if len(rows) >= 65536:
+                sys.stdout.write("".join(rows))
+                rows = []
+        sys.stdout.write("".join(rows))
+
+    def write_bins(self, s, bins):
+        # --bins output: a row per bucket in value order, from the smallest
+        # value to the largest. when that's more buckets than --height,
+        # neighbouring ones are merged into rows covering equal index ranges
+        rowCounts = []
+        if bins.nonPositive:
+            rowCounts.append((f"{min(bins.min, 0):.4g}..0", bins.nonPositive))
+        if bins.counts:
+            firstIndex = min(bins.counts)
+            lastIndex = max(bins.counts)
+            numRows = max(s.height - len(rowCounts), 1)
+            perRow = -(-(lastIndex - firstIndex + 1) // numRows)
+            # the buckets in use, not every one in the range, get added up:
+            # there can be any number of empty ones between them
+            rowTotals = Counter()
+            for index in sorted(bins.counts):
+                rowTotals[(index - firstIndex) // perRow] += bins.counts[index]
+            for row in range(-(-(lastIndex - firstIndex + 1) // perRow)):
+                index = firstIndex + row * perRow
+                low = bins.bounds(index)[0]
+                high = bins.bounds(min(index + perRow, lastIndex + 1) - 1)[1]
+                rowCounts.append((f"{low:.4g}..{high:.4g}", rowTotals[row]))
+
+        s.endTime = int(time.time() * 1000)
+        totalMillis = s.endTime - s.startTime
+        if s.verbose:
+            err = sys.stderr
+            err.write(f"       lines examined: {s.totalObjects:,d}\n")
+            err.write(f"        values binned: {bins.count:,d}\n")
+            numBuckets = len(bins.counts) + bool(bins.nonPositive)
+            err.write(f"         buckets used: {numBuckets:,d}\n")
+            if bins.count:
+                err.write(
+                    f"         min/mean/max: {bins.min:.4g} / "
+                    f"{bins.sum / bins.count:.4g} / {bins.max:.4g}\n"
+                )
+                quantiles = [bins.quantile(q) for q in (0.5, 0.9, 0.99, 0.999)]
+                err.write(
+                    "     p50/p90/p99/p999: "
+                    + " / ".join(f"{q:.4g}" for q in quantiles)
+                    + "\n"
+                )
+            err.write(f"              runtime: {totalMillis:,.2f}ms\n")
+        if not rowCounts:
+            return
+
+        maxVal = max(count for _, count in rowCounts)
+        total = bins.count
+        maxKeyWidth = max(len(key) for key, _ in rowCounts)
+        maxValueWidth = len(str(maxVal))
+        maxPctWidth = len(f"({maxVal / total * 100:2.2f}%)")
+        histWidth = (
+            s.width - (maxKeyWidth + 1) - (maxValueWidth + 1) - (maxPctWidth + 1) - 1
+        )
+
+        header = (
+            "Bin".rjust(maxKeyWidth)
+            + "|"
+            + "Ct".ljust(maxValueWidth)
+            + " "
+            + "(Pct)".ljust(maxPctWidth)
+            + " "
+            + "Histogram"
+            + s.keyColour
+            + "\n"
+        )
+        bar = self.plan_bars(s, histWidth, maxVal)
+        rowFormat = (
+            f"{{:>{maxKeyWidth}}}{s.regularColour}|{s.ctColour}"
+            f"{{:>{maxValueWidth}}} {s.pctColour}{{:>{maxPctWidth}}} "
+            f"{s.graphColour}{{}}{{}}\n"
+        )
+        rows = []
+        for n, (key, count) in enumerate(rowCounts):
+            pct = f"({count / total * 100:2.2f}%)"
+            # empty buckets get no bar at all, so gaps in the input show up
+            endColour = s.regularColour if n == len(rowCounts) - 1 else s.keyColour
+            barText = bar(count) if count else ""
+            rows.append(rowFormat.format(key, count, pct, barText, endColour))
+
+        sys.stderr.write(header)
+        sys.stdout.write("".join(rows))
+
+    def redraw(self, s, tokenDict, errorDict, topKeys):
+        # live mode: draw the histogram over the previous one instead of
+        # scrolling. the whole frame goes out in one write: cursor home, each
+        # line cleared to its end as it's drawn, then whatever the previous
+        # (taller) frame left below it gets cleared
+        frame = io.StringIO()
+        self.write_hist(s, tokenDict, errorDict, topKeys, frame, frame)
+        eraseLine = chr(27) + "[K\n"
+        sys.stdout.write(
+            chr(27)
+            + "[H"
+            + frame.getvalue().replace("\n", eraseLine)
+            + chr(27)
+            + "[J"
+        )
+        sys.stdout.flush()
+
+
+def format_count(value, grouping=""):
+    # counts are ints, unless they've been decayed or summed from floats
+    if isinstance(value, float):
+        return f"{value:{grouping}.2f}"
+    return f"{value:{grouping}d}"
+
+
+def parse_duration(duration):
+    # seconds in a duration like 90, 90s, 5m, 2h or 1d
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if duration[-1:] in units:
+        return float(duration[:-1]) * units[duration[-1]]
+    return float(duration)
+
+
+def parse_size(size):
+    # bytes in a size like 65536, 64K, 512M or 2G
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    if size[-1:].upper() in units:
+        return int(float(size[:-1]) * units[size[-1].upper()])
+    return int(size)
+
+
+def format_size(size):
+    # a size in bytes the way parse_size takes them, eg 1.5K or 512.0M
+    unit = ""
+    for nextUnit in ("K", "M", "G", "T"):
+        if size < 1024:
+            break
+        size /= 1024
+        unit = nextUnit
+    return f"{size:,.1f}{unit}"
+
+
+def dict_memory(tokenDict):
+    # roughly how many bytes a dict of key to count holds: per key, its
+    # share of the dict's table, the count and the key itself - key sizes
+    # going by the first hundred keys
+    if not tokenDict:
+        return 0
+    sample = list(islice(tokenDict, 100))
+    keyBytes = sum(map(sys.getsizeof, sample)) / len(sample)
+    return int(len(tokenDict) * (keyBytes + 50 + 32))
+
+
+def parse_field(field):
+    # a 1-based field number like 5 into a 0-based index like 4
+    index = int(field) - 1
+    if index < 0:
+        raise ValueError("fields are numbered from 1")
+    return index
+
+
+def parse_fields(fields):
+    # 1-based field numbers like 5,7+9 into groups of 0-based indexes like
+    # [(4,), (6, 8)], + joining fields that are counted together
+    return [
+        tuple(parse_field(field) for field in group.split("+"))
+        for group in fields.split(",")
+    ]
+
+
+def top_keys(tokenDict, n):
+    # the n keys with the highest counts, highest first. ties are broken by
+    # the key itself, so the order is deterministic when we have multiple
+    # entries with the same frequency: it's what sorting on (count, key) in
+    # reverse gives, but a heap selection only costs O(len * log n) and
+    # compares plain tuples, with no key function called per entry
+    return [k for v, k in heapq.nlargest(n, zip(tokenDict.values(), tokenDict))]
+
+
+class PruningCounter:
+    """
+    The original counting engine: an exact dict of key to count that gets cut
+    back to the maxKeys most frequent keys every keyPruneInterval matched
+    tokens. Cheap per update, but keys evicted by a prune that come back later
+    restart from zero with no indication their count is low
+    """
+
+    # keys looked at in each step of trimming to a --memory budget
+    pruneStep = 65536
+
+    def __init__(self, s):
+        self.tokenDict = {}
+        # exact counts, so no error bounds to report
+        self.errorDict = None
+        # while trimming: the keys there were when it started, how far
+        # through them we are, the count at or below which they go and how
+        # many more of them have to go
+        self.pruneKeys = None
+        self.prunePos = 0
+        self.pruneBelow = 0
+        self.pruneLeft = 0
+
+    def insert(self, s, key, weight):
+        self.tokenDict[key] = weight
+
+    def merge(self, s, tally, totalValues):
+        # fold a partial tokenDict (as returned by Tokenizer.tally) into ours
+        tokenDict = self.tokenDict
+        for k, v in tally.items():
+            if k in tokenDict:
+                tokenDict[k] += v
+            else:
+                tokenDict[k] = v
+        s.totalValues += totalValues
+
+    def tick(self, s):
+        # called as time passes, returns whether any counts went down
+        return False
+
+    def scale(self, factor):
+        tokenDict = self.tokenDict
+        for k in tokenDict:
+            tokenDict[k] *= factor
+
+    def prune_keys(self, s):
+        newDict = {}
+        for k in top_keys(self.tokenDict, s.maxKeys + 2):
+            if k:
+                newDict[k] = self.tokenDict[k]
+                if len(newDict) > s.maxKeys:
+                    break
+        # prune in place, the readers hold on to a reference to tokenDict
+        self.tokenDict.clear()
+        self.tokenDict.update(newDict)
+        s.numPrunes += 1
+
+    def trim(self, s, budget):
+        # --memory: once over budget, evict the lowest counts until back
+        # under three quarters of it. rather than one big prune that sorts
+        # every key, this is done a step at a time, each call looking at the
+        # next pruneStep keys - returns whether there was any pruning to do
+        tokenDict = self.tokenDict
+        if self.pruneKeys is None:
+            used = self.memory()
+            if used <= budget:
+                return False
+            # how many keys have to go, and how low a count has to be for
+            # there to be that many, going by how many keys have each count.
+            # there are always at least enough keys left to fill the histogram
+            self.pruneLeft = min(
+                int(len(tokenDict) * (1 - budget * 0.75 / used)) + 1,
+                len(tokenDict) - s.height,
+            )
+            if self.pruneLeft <= 0:
+                return False
+            spread = Counter(tokenDict.values())
+            numBelow = 0
+            for count in sorted(spread):
+                numBelow += spread[count]
+                if numBelow >= self.pruneLeft:
+                    break
+            self.pruneBelow = count
+            self.pruneKeys = list(tokenDict)
+            self.prunePos = 0
+
+        # usually one step is enough to get back under budget for now, but
+        # if keys arrive faster than that they get more steps. the keys at
+        # the threshold go only as long as there are still too many keys
+        below = self.pruneBelow
+        while self.pruneKeys is not None:
+            pos = self.prunePos
+            for k in self.pruneKeys[pos : pos + self.pruneStep]:
+                if tokenDict[k] <= below:
+                    del tokenDict[k]
+                    self.pruneLeft -= 1
+                    if not self.pruneLeft:
+                        break
+            self.prunePos += self.pruneStep
+            if self.prunePos >= len(self.pruneKeys) or not self.pruneLeft:
+                self.pruneKeys = None
+                s.numPrunes += 1
+            if self.memory() <= budget:
+                break
+        return True
+
+    def memory(self):
+        return dict_memory(self.tokenDict)
+
+
+class SpaceSaving:
+    """
+    Bounded-memory heavy-hitter counter using the Space-Saving algorithm of
+    Metwally, Agrawal and El Abbadi. At most maxKeys keys are ever held. A key
+    not yet held evicts the current minimum and inherits its count, and that
+    inherited count is kept in errorDict as the most the key can be overcounted
+    """
+
+    def __init__(self, s):
+        self.tokenDict = {}
+        self.errorDict = {}
+        # min-heap of (count, key), one entry per key held. counts in tokenDict
+        # are bumped in place without touching the heap, so entries can go
+        # stale (too low) and are only refreshed when we look for a victim
+        self.heap = []
+
+    def insert(self, s, key, weight):
+        tokenDict = self.tokenDict
+        heap = self.heap
+        if len(tokenDict) < s.maxKeys:
+            tokenDict[key] = weight
+            self.errorDict[key] = 0
+            heapq.heappush(heap, (weight, key))
+            return
+
+        # find the true minimum: a stale entry at the top of the heap gets
+        # pushed back down with its current count until the top is accurate
+        minVal, minKey = heap[0]
+        while tokenDict[minKey] != minVal:
+            heapq.heapreplace(heap, (tokenDict[minKey], minKey))
+            minVal, minKey = heap[0]
+
+        del tokenDict[minKey]
+        del self.errorDict[minKey]
+        tokenDict[key] = minVal + weight
+        self.errorDict[key] = minVal
+        heapq.heapreplace(heap, (minVal + weight, key))
+
+    def merge(self, s, tally, totalValues):
+        # fold a partial tokenDict (as returned by Tokenizer.tally) into ours
+        tokenDict = self.tokenDict
+        for k, v in tally.items():
+            if k in tokenDict:
+                tokenDict[k] += v
+            else:
+                self.insert(s, k, v)
+        s.totalValues += totalValues
+
+    def tick(self, s):
+        # called as time passes, returns whether any counts went down
+        return False
+
+    def scale(self, factor):
+        # scaling every count by the same factor keeps the heap a heap
+        for d in (self.tokenDict, self.errorDict):
+            for k in d:
+                d[k] *= factor
+        self.heap = [(v * factor, k) for v, k in self.heap]
+
+    def prune_keys(self, s):
+        # memory is bounded by maxKeys at all times, nothing to prune
+        pass
+
+    def trim(self, s, budget):
+        # --memory: once over budget, evict the lowest counts until back
+        # under three quarters of it (but never below a histogram's worth),
+        # then hold no more keys than are left. those all have counts at
+        # least as high as the ones evicted, so a key evicted that comes
+        # back still inherits as much as it can have had
+        tokenDict = self.tokenDict
+        used = self.memory()
+        if used <= budget or len(tokenDict) <= s.height:
+            return False
+        keep = max(int(len(tokenDict) * budget * 0.75 / used), s.height)
+        lowest = heapq.nsmallest(
+            len(tokenDict) - keep, zip(tokenDict.values(), tokenDict)
+        )
+        for v, k in lowest:
+            del tokenDict[k]
+            del self.errorDict[k]
+        self.heap = [(v, k) for k, v in tokenDict.items()]
+        heapq.heapify(self.heap)
+        s.maxKeys = keep
+        s.numPrunes += 1
+        return True
+
+    def memory(self):
+        # the heap holds a tuple per key, on top of the two dicts
+        return (
+            dict_memory(self.tokenDict)
+            + dict_memory(self.errorDict)
+            + sys.getsizeof(self.heap)
+            + len(self.heap) * 56
+        )
+
+
+class CompactCounter:
+    """
+    Exact counts like PruningCounter, for many more keys in the same memory:
+    counts are kept in an open-addressed hash table of two arrays, each key's
+    64-bit hash and its count, 24 bytes a key at most. Key names are only
+    kept for the namedKeys highest counts, the keys that can still make the
+    histogram - a key whose count goes up is at hand to be named again, and
+    one that never beats the lowest named count again can't end up above
+    them. Keys whose 64-bit hashes collide get counted together, which at
+    one in 2^64 a pair isn't a worry
+    """
+
+    def __init__(self, s):
+        # the named keys and their counts
+        self.tokenDict = {}
+        # exact counts, so no error bounds to report
+        self.errorDict = None
+        # min-heap of (count, key) for the named keys, its entries going
+        # stale and getting refreshed as in SpaceSaving
+        self.heap = []
+        self.namedKeys = s.height + 3000
+        # decayed or summed counts aren't whole numbers - though summed ones
+        # often are, and get named as ints when they are, like in a dict
+        self.countType = "d" if s.decay or s.weightField is not None else "q"
+        self.wholeCounts = s.weightField is not None and not s.decay
+        self.numKeys = 0
+        self.allocate(1024)
+
+    def allocate(self, size):
+        # an empty table of size (a power of two) slots, hash 0 being empty
+        self.hashes = array("q", bytes(8 * size))
+        self.counts = array(self.countType, bytes(8 * size))
+        self.mask = size - 1
+
+    def find(self, h):
+        # the slot key hash h is in, or the empty slot it would go in
+        hashes = self.hashes
+        mask = self.mask
+        i = h & mask
+        while hashes[i] != h and hashes[i]:
+            i = (i + 1) & mask
+        return i
+
+    def rehash(self, size, threshold=None, room=0, tieCutoff=0):
+        # move the keys into a table of size slots, leaving out those with
+        # counts below threshold, and of those equal to it all but room of
+        # the ones whose hashes' top 32 bits are tieCutoff at most
+        oldHashes, oldCounts = self.hashes, self.counts
+        self.allocate(size)
+        hashes, counts, mask = self.hashes, self.counts, self.mask
+        numKeys = 0
+        for h, count in zip(oldHashes, oldCounts):
+            if not h:
+                continue
+            if threshold is not None and count <= threshold:
+                if count < threshold or room == 0 or h >> 32 > tieCutoff:
+                    continue
+                room -= 1
+            i = h & mask
+            while hashes[i]:
+                i = (i + 1) & mask
+            hashes[i] = h
+            counts[i] = count
+            numKeys += 1
+        self.numKeys = numKeys
+
+    def insert(self, s, key, count):
+        # name key if its count is up among the highest named ones
+        tokenDict = self.tokenDict
+        heap = self.heap
+        if len(tokenDict) < self.namedKeys:
+            tokenDict[key] = count
+            heapq.heappush(heap, (count, key))
+            return
+
+        # the heap's top entry may be stale, but never too high
+        minVal, minKey = heap[0]
+        if count <= minVal:
+            return
+        while tokenDict[minKey] != minVal:
+            heapq.heapreplace(heap, (tokenDict[minKey], minKey))
+            minVal, minKey = heap[0]
+        if count <= minVal:
+            return
+        del tokenDict[minKey]
+        tokenDict[key] = count
+        heapq.heapreplace(heap, (count, key))
+
+    def merge(self, s, tally, totalValues):
+        # fold a partial tokenDict (as returned by Tokenizer.tally) into ours
+        tokenDict = self.tokenDict
+        heap = self.heap
+        namedKeys = self.namedKeys
+        hashes, counts, mask = self.hashes, self.counts, self.mask
+        numKeys = self.numKeys
+        wholeCounts = self.wholeCounts
+        for k, v in tally.items():
+            # grow the table once it's two thirds full
+            if numKeys * 3 > mask * 2:
+                self.numKeys = numKeys
+                self.rehash((mask + 1) * 2)
+                hashes, counts, mask = self.hashes, self.counts, self.mask
+            # (0 marks an empty slot)
+            h = hash(k) or 1
+            i = h & mask
+            slotHash = hashes[i]
+            while slotHash != h and slotHash:
+                i = (i + 1) & mask
+                slotHash = hashes[i]
+            if not slotHash:
+                hashes[i] = h
+                numKeys += 1
+            count = counts[i] + v
+            counts[i] = count
+            if wholeCounts and count.is_integer():
+                count = int(count)
+            if k in tokenDict:
+                tokenDict[k] = count
+            elif len(tokenDict) < namedKeys or count > heap[0][0]:
+                self.insert(s, k, count)
+        self.numKeys = numKeys
+        s.totalValues += totalValues
+
+    def tick(self, s):
+        # called as time passes, returns whether any counts went down
+        return False
+
+    def scale(self, factor):
+        self.counts = array(self.countType, [c * factor for c in self.counts])
+        tokenDict = self.tokenDict
+        for k in tokenDict:
+            tokenDict[k] *= factor
+        self.heap = [(v * factor, k) for v, k in self.heap]
+
+    def prune_keys(self, s):
+        # there's only any pruning to do once the table has grown past maxKeys
+        if self.numKeys > s.maxKeys:
+            self.cut(s, s.maxKeys)
+
+    def trim(self, s, budget):
+        # --memory: once over budget, cut the table back to as many keys as
+        # fit in three quarters of it. the table's counts get sorted to do
+        # so, but they're a flat array of numbers, and sort quickly
+        used = self.memory()
+        if used <= budget or self.numKeys <= s.height:
+            return False
+        # as many table slots (a power of two, filled two thirds at most) as
+        # fit along with the named keys, of which there are then no more
+        # than there are keys left - going by the real bytes of each
+        slotBytes = self.hashes.itemsize + self.counts.itemsize
+        namedBytes = used - slotBytes * len(self.hashes)
+        perName = namedBytes / max(len(self.tokenDict), 1)
+
+        def cut_memory(size):
+            return size * slotBytes + perName * min(len(self.tokenDict), size * 2 // 3)
+
+        size = 1024
+        while cut_memory(size * 2) <= budget * 0.75:
+            size *= 2
+        self.cut(s, max(min(size * 2 // 3, self.numKeys), s.height))
+        return True
+
+    def cut(self, s, maxKeys):
+        # cut the table back to the maxKeys highest counts. ties at the
+        # lowest of them go by the top bits of their hashes: going by where
+        # they are in the table (the bottom bits) would keep the ones in its
+        # first slots, all in one long run of slots in the new table
+        counts = sorted(c for h, c in zip(self.hashes, self.counts) if h)
+        threshold = None
+        room = 0
+        tieCutoff = 0
+        if maxKeys < len(counts):
+            threshold = counts[-maxKeys]
+            room = maxKeys - (len(counts) - bisect.bisect_right(counts, threshold))
+            ties = sorted(
+                h >> 32
+                for h, c in zip(self.hashes, self.counts)
+                if h and c == threshold
+            )
+            tieCutoff = ties[room - 1]
+        size = 1024
+        while size * 2 < maxKeys * 3:
+            size *= 2
+        self.rehash(size, threshold, room, tieCutoff)
+
+        # named keys that were pruned go too
+        hashes = self.hashes
+        tokenDict = self.tokenDict
+        for k in list(tokenDict):
+            if not hashes[self.find(hash(k) or 1)]:
+                del tokenDict[k]
+        self.heap = [(v, k) for k, v in tokenDict.items()]
+        heapq.heapify(self.heap)
+        s.numPrunes += 1
+
+    def memory(self):
+        # bytes used by the table, the named keys and the heap of them
+        tokenDict = self.tokenDict
+        return (
+            self.hashes.itemsize * len(self.hashes)
+            + self.counts.itemsize * len(self.counts)
+            + sys.getsizeof(tokenDict)
+            + sum(map(sys.getsizeof, tokenDict))
+            + sys.getsizeof(self.heap)
+            + sum(map(sys.getsizeof, self.heap))
+        )
+
+
+class SlidingWindow:
+    """
+    Exact counts over the last --window seconds of input, kept as a ring of
+    --window-buckets sub-window buckets. tokenDict holds the totals across
+    the buckets, and when a bucket falls out of the window its counts are
+    subtracted from those totals, which costs as much as the bucket has keys
+    """
+
+    def __init__(self, s):
+        self.tokenDict = {}
+        # exact counts, so no error bounds to report
+        self.errorDict = None
+        self.bucketLen = s.window / s.windowBuckets
+        # oldest first: [bucket number, bucket tokenDict, bucket totalValues]
+        self.buckets = deque()
+
+    def merge(self, s, tally, totalValues):
+        bucketNum = int(time.time() / self.bucketLen)
+        if not self.buckets or self.buckets[-1][0] != bucketNum:
+            self.buckets.append([bucketNum, {}, 0])
+        bucket = self.buckets[-1]
+        bucketDict = bucket[1]
+        tokenDict = self.tokenDict
+        for k, v in tally.items():
+            bucketDict[k] = bucketDict.get(k, 0) + v
+            tokenDict[k] = tokenDict.get(k, 0) + v
+        bucket[2] += totalValues
+        s.totalValues += totalValues
+
+    def tick(self, s):
+        # expire buckets that have slid out of the window
+        oldestBucket = int(time.time() / self.bucketLen) - s.windowBuckets + 1
+        tokenDict = self.tokenDict
+        expired = False
+        while self.buckets and self.buckets[0][0] < oldestBucket:
+            bucketNum, bucketDict, bucketValues = self.buckets.popleft()
+            for k, v in bucketDict.items():
+                remaining = tokenDict[k] - v
+                if remaining:
+                    tokenDict[k] = remaining
+                else:
+                    del tokenDict[k]
+            s.totalValues -= bucketValues
+            expired = True
+        return expired
+
+    def prune_keys(self, s):
+        # memory is bounded by what the window holds, and pruning the totals
+        # would leave them out of step with the buckets
+        pass
+
+    def trim(self, s, budget):
+        return False
+
+    def memory(self):
+        return dict_memory(self.tokenDict) + sum(
+            dict_memory(bucket[1]) for bucket in self.buckets
+        )
+
+
+class ExponentialDecay:
+    """
+    Wraps a counting engine so older input counts for less: every count
+    halves each --decay seconds. Rather than touching every key as time
+    passes, new input is weighted up by 2^(time since landmark / half-life)
+    and the counts shown are scaled back down by the same factor, which
+    leaves their order and percentages alone. Only when the weights grow
+    huge does everything get rescaled and the landmark move up to now
+    """
+
+    def __init__(self, s, counter):
+        self.counter = counter
+        self.tokenDict = counter.tokenDict
+        self.errorDict = counter.errorDict
+        self.landmark = time.time()
+
+    def weight(self, s):
+        return 2.0 ** ((time.time() - self.landmark) / s.decay)
+
+    def merge(self, s, tally, totalValues):
+        weight = self.weight(s)
+        self.counter.merge(
+            s, {k: v * weight for k, v in tally.items()}, totalValues * weight
+        )
+
+    def tick(self, s):
+        weight = self.weight(s)
+        if weight > 2.0**64:
+            self.counter.scale(1 / weight)
+            s.totalValues /= weight
+            self.landmark = time.time()
+            weight = 1.0
+        s.countScale = s.sampleScale / weight
+        return False
+
+    def prune_keys(self, s):
+        self.counter.prune_keys(s)
+
+    def trim(self, s, budget):
+        return self.counter.trim(s, budget)
+
+    def memory(self):
+        return self.counter.memory()
+
+
+class LineSampler:
+    """
+    --sample and --reservoir: count only some of the lines, the counts being
+    scaled back up for the histogram. --sample keeps each line with
+    probability P. Rather than a random number per line, the gaps between
+    the lines kept are drawn from the geometric distribution, so a skipped
+    line costs nothing but being split off from its chunk - it's never
+    decoded, let alone tokenized. --reservoir keeps a uniform sample of N
+    lines of the whole input, skipping ahead the same way (Li's algorithm
+    L), which gets counted once the input ends
+    """
+
+    def __init__(self, s):
+        import random
+
+        self.random = random.random
+        self.randrange = random.randrange
+        if s.sampleRate:
+            self.logSkip = math.log(1 - s.sampleRate)
+
+    def skip(self, logSkip):
+        # how many lines to skip before the next one kept
+        return int(math.log(1 - self.random()) / logSkip)
+
+    def sample(self, s, chunk):
+        # --sample: chunk with only the lines kept left in it. the gaps
+        # between them are drawn a batch at a time, a few more than are
+        # likely to be needed, which is quicker than drawing each in a loop
+        lines = split_byte_lines(chunk)
+        log = math.log
+        random = self.random
+        logSkip = self.logSkip
+        picked = [-1]
+        while picked[-1] < len(lines):
+            draws = int((len(lines) - picked[-1]) * s.sampleRate * 1.1) + 8
+            gaps = (int(log(1 - random()) / logSkip) + 1 for _ in range(draws))
+            picked += accumulate(gaps, initial=picked.pop())
+        kept = [lines[i] for i in picked[1 : bisect.bisect_left(picked, len(lines))]]
+        s.linesSeen += len(lines)
+        s.linesSampled += len(kept)
+        return b"\n".join(kept) + b"\n" if kept else b""
+
+    def fill(self, s, chunks):
+        # --reservoir: read all of chunks, yielding the reservoir as a single
+        # chunk at the end. (a None in chunks, meaning no input for a while,
+        # is passed on.) the counts are scaled up by lines read per line kept
+        size = s.reservoirSize
+        reservoir = []
+        # how many lines have been read, the one to put in the reservoir
+        # next and the W of algorithm L
+        seen = 0
+        nextLine = 0
+        w = 1.0
+        for chunk in chunks:
+            if chunk is None:
+                yield None
+                continue
+            if len(reservoir) == size:
+                # once full, most chunks have no line in them to keep, and
+                # counting their lines is far quicker than splitting them
+                numLines = chunk.count(b"\n") + (chunk[-1:] not in (b"\n", b""))
+                if nextLine >= seen + numLines:
+                    seen += numLines
+                    continue
+            lines = split_byte_lines(chunk)
+            if len(reservoir) < size:
+                reservoir.extend(lines[: size - len(reservoir)])
+                if len(reservoir) == size:
+                    w = math.exp(math.log(1 - self.random()) / size)
+                    nextLine = size + self.skip(math.log(1 - w))
+            if len(reservoir) == size:
+                while nextLine < seen + len(lines):
+                    reservoir[self.randrange(size)] = lines[nextLine - seen]
+                    w *= math.exp(math.log(1 - self.random()) / size)
+                    nextLine += 1 + self.skip(math.log(1 - w))
+            seen += len(lines)
+        s.linesSeen = seen
+        s.linesSampled = len(reservoir)
+        if reservoir:
+            scale = seen / len(reservoir)
+            s.sampleScale = s.countScale = int(scale) if scale.is_integer() else scale
+            yield b"\n".join(reservoir) + b"\n"
+
+
+class HyperLogLog:
+    """
+    Estimates how many distinct keys have been seen, in 2^precision bytes
+    and to within about 1.04 / sqrt(2^precision) - 1.6% at the default
+    precision. Keys are hashed with hash(), which strings and bytes cache, so
+    it costs next to nothing - but it's salted per process, so a portable
+    sketch, one that's saved for other runs to merge, hashes with blake2b
+    instead
+    """
+
+    def __init__(self, precision=12, portable=True):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+        self.portable = portable
+
+    def update(self, keys, encoding):
+        # keys are bytes or str. each register keeps the longest run of
+        # leading zeros seen in the hashes that land on it
+        registers = self.registers
+        precision = self.precision
+        mask = len(registers) - 1
+        maxRank = 65 - precision
+        if not self.portable:
+            # the empty key, which isn't counted, is the one that hashes to 0
+            for h in map(hash, keys):
+                if not h:
+                    continue
+                h &= 0xFFFFFFFFFFFFFFFF
+                rank = maxRank - (h >> precision).bit_length()
+                if rank > registers[h & mask]:
+                    registers[h & mask] = rank
+            return
+        # str gets the same bytes save_state writes
+        from hashlib import blake2b
+
+        for k in keys:
+            if not k:
+                continue
+            if not isinstance(k, bytes):
+                k = k.encode(encoding, "surrogateescape")
+            h = int.from_bytes(blake2b(k, digest_size=8).digest(), "little")
+            rank = maxRank - (h >> precision).bit_length()
+            if rank > registers[h & mask]:
+                registers[h & mask] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("can't merge distinct-key sketches of differing precision")
+        if other.portable != self.portable:
+            raise ValueError("can't merge distinct-key sketches hashed differently")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # few keys yet: count the registers nothing has landed on instead
+            return m * math.log(m / zeros)
+        return raw
+
+    def error(self):
+        # relative standard error of estimate()
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class NumericBins:
+    """
+    Counts numeric input into buckets rather than keeping every value:
+    fixed-width (--bins=W), powers of two (--bins=log) or, like
+    HdrHistogram, powers of two split into HDR_SUB_BUCKETS linear
+    sub-buckets (--bins=hdr), good to about 3% of any value. Memory depends
+    on the range of the values, never on how many there are
+    """
+
+    HDR_SUB_BUCKETS = 32
+
+    def __init__(self, s):
+        self.mode = s.bins
+        self.binWidth = s.binWidth
+        # bucket index -> count. zero and negative values have no log, so
+        # in log and hdr modes they're counted apart
+        self.counts = Counter()
+        self.nonPositive = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def index(self, value):
+        if self.mode == "fixed":
+            return math.floor(value / self.binWidth)
+        mantissa, exponent = math.frexp(value)
+        if self.mode == "log":
+            return exponent
+        subBuckets = self.HDR_SUB_BUCKETS
+        return exponent * subBuckets + int((mantissa - 0.5) * 2 * subBuckets)
+
+    def bounds(self, index):
+        # the [low, high) range of values counted by a bucket
+        if self.mode == "fixed":
+            return index * self.binWidth, (index + 1) * self.binWidth
+        if self.mode == "log":
+            return math.ldexp(0.5, index), math.ldexp(1.0, index)
+        subBuckets = self.HDR_SUB_BUCKETS
+        exponent, sub = divmod(index, subBuckets)
+        return (
+            math.ldexp(0.5 + sub / (2 * subBuckets), exponent),
+            math.ldexp(0.5 + (sub + 1) / (2 * subBuckets), exponent),
+        )
+
+    def update(self, lines):
+        # lines are raw bytes. numeric input repeats itself a lot, so each
+        # distinct line is only parsed and bucketed once
+        counts = self.counts
+        positiveOnly = self.mode != "fixed"
+        binned = 0
+        for line, n in Counter(lines).items():
+            try:
+                value = float(line)
+            except ValueError:
+                continue
+            if not math.isfinite(value):
+                continue
+            if positiveOnly and value <= 0:
+                self.nonPositive += n
+            else:
+                counts[self.index(value)] += n
+            binned += n
+            self.sum += value * n
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+        self.count += binned
+        return binned
+
+    def quantile(self, q):
+        # the value q of the way through the sorted input, interpolated
+        # within the bucket it falls in
+        rank = q * self.count
+        seen = self.nonPositive
+        if rank <= seen:
+            return self.min
+        for index in sorted(self.counts):
+            n = self.counts[index]
+            if seen + n >= rank:
+                low, high = self.bounds(index)
+                value = low + (high - low) * (rank - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+
+class WordTable(dict):
+    """
+    str.translate() table that turns every character the regexp \\W matches,
+    other than newline, into a space. Unicode has far too many non-word
+    characters to list up front, so entries are filled in as they're seen
+    """
+
+    def __missing__(self, c):
+        # \\w is exactly what str.isalnum() calls alphanumeric, plus _
+        ch = chr(c)
+        self[c] = c if ch.isalnum() or ch in "_\n" else 32
+        return self[c]
+
+
+class Tokenizer:
+    """
+    Turns raw input chunks into tallied tokens. Holds nothing but the compiled
+    split/match regexps and the input encoding, so it can be pickled and
+    shipped to worker processes when tokenizing with --jobs
+    """
+
+    def __init__(self, s):
+        # the built-in presets get dedicated code below, but keep the regexps
+        # they stand for around for anything that still wants them
+        self.tokenizeMode = s.tokenize if s.tokenize in ("white", "word") else ""
+        self.matchMode = s.matchRegexp
+        if self.matchMode == "number":
+            self.matchMode = "num"
+
+        # how to split the input... typically we split on whitespace or
+        # word boundaries, but the user can specify any regexp
+        if s.tokenize == "white":
+            s.tokenize = r"\s+"
+        elif s.tokenize == "word":
+            s.tokenize = r"\W"
+
+        # how to match (filter) the input... typically we want either
+        # all-alpha or all-numeric, but again, user can specify
+        if s.matchRegexp == "word":
+            s.matchRegexp = r"^[A-Z,a-z]+$"
+        elif s.matchRegexp in ["num", "number"]:
+            s.matchRegexp = r"^\d+$"
+
+        # docs say these are cached, but i got about 2x speed boost
+        # from doing the compile. only compiled when the presets don't
+        # cover them, re taking a while to import
+        self.tokenize = s.tokenize
+        self.pt = None
+        if s.tokenize and not self.tokenizeMode:
+            import re
+
+            try:
+                self.pt = re.compile(s.tokenize)
+            except re.error as e:
+                s.usage_error(f"--tokenize={s.tokenize}: {e}")
+        self.wordTable = WordTable()
+
+        # the matchers a token has to pass, each one a C-level predicate.
+        # the default "." matches anything but the empty string, so needs
+        # no matcher at all
+        if s.matchRegexp == ".":
+            self.matchers = ()
+        elif self.matchMode == "num":
+            # \\d+ is a run of unicode decimal digits, which is isdecimal()
+            self.matchers = (str.isdecimal,)
+        elif self.matchMode == "word" and self.tokenizeMode == "word":
+            # [A-Z,a-z]+ is ascii letters (or commas, but word-split tokens
+            # never contain any)
+            self.matchers = (str.isascii, str.isalpha)
+        else:
+            import re
+
+            try:
+                self.matchers = (re.compile(s.matchRegexp).match,)
+            except re.error as e:
+                s.usage_error(f"--match={s.matchRegexp}: {e}")
+
+        # whole lines that need no matching are counted as raw bytes
+        self.emptyToken = b"" if not (s.tokenize or self.matchers) else ""
+
+        self.encoding = s.encoding
+        self.errors = s.encodingErrors
+        self.maxKeyLen = s.maxKeyLen
+
+    def split_tokens(self, chunk):
+        # split a chunk into a list of tokens, and also return how many
+        # tokens splitting it line by line on the regexp would have examined
+        # (which includes the empty strings re.split() leaves around
+        # separators at the start or end of a line, or next to each other)
+        if self.emptyToken == b"":
+            # user just wants every line to be a token - keep the raw bytes,
+            # only the keys that make it into the histogram get decoded
+            tokens = split_byte_lines(chunk)
+            return tokens, len(tokens)
+
+        text = chunk.decode(self.encoding, self.errors)
+        if self.tokenizeMode == "white":
+            # newline is whitespace too, so split the whole chunk in one go.
+            # re.split(r"\s+") also gives an empty token for an empty line,
+            # and for whitespace at the start or at the end of a line
+            lines = text.split("\n")
+            if lines[-1] == "":
+                lines.pop()
+            tokens = text.split()
+            examined = (
+                len(tokens)
+                + sum(map(str.isspace, map(itemgetter(slice(0, 1)), lines)))
+                + sum(map(str.isspace, map(itemgetter(slice(-1, None)), lines)))
+                + lines.count("")
+            )
+            return tokens, examined
+
+        if self.tokenizeMode == "word":
+            # every non-word character becomes a space, then a plain split
+            # gives the non-empty tokens. re.split(r"\W") gives one token
+            # more than there are separators on each line
+            text = text.translate(self.wordTable)
+            numLines = text.count("\n") + (not text.endswith("\n"))
+            return text.split(), text.count(" ") + numLines
+
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        if self.tokenize:
+            tokens = list(chain.from_iterable(map(self.pt.split, lines)))
+        else:
+            tokens = lines
+        return tokens, len(tokens)
+
+    def tally(self, chunk):
+        # tokenize and count one chunk of input, returning the partial
+        # tokenDict along with how many tokens were examined and matched.
+        # all the per-token work happens inside C: splitting, chaining the
+        # tokens together and counting them with collections.Counter
+        tokens, totalObjects = self.split_tokens(chunk)
+        tokenDict = self.match_tokens(self.count_tokens(tokens))
+        return tokenDict, totalObjects, sum(tokenDict.values())
+
+    def count_tokens(self, tokens):
+        return Counter(tokens)
+
+    def match_tokens(self, tokenDict):
+        # matching is done once per distinct token instead of per token
+        if self.matchers:
+            keep = iter(tokenDict)
+            for matcher in self.matchers:
+                keep = filter(matcher, keep)
+            keep = list(keep)
+            tokenDict = dict(zip(keep, map(tokenDict.__getitem__, keep)))
+        else:
+            tokenDict.pop(self.emptyToken, None)
+        if self.maxKeyLen and max(map(len, tokenDict), default=0) > self.maxKeyLen:
+            tokenDict = self.truncate_keys(tokenDict)
+        return tokenDict
+
+    def truncate_keys(self, tokenDict):
+        # --max-key-len: tokens that are the same once cut short count as one
+        # whole lines are counted as bytes, which get cut at a character, not
+        # part way through one
+        maxKeyLen = self.maxKeyLen
+        encoding = self.encoding
+        truncated = {}
+        for k, v in tokenDict.items():
+            if not isinstance(k, bytes):
+                k = k[:maxKeyLen]
+            elif len(k) > maxKeyLen:
+                k = k.decode(encoding, "surrogateescape")[:maxKeyLen]
+                k = k.encode(encoding, "surrogateescape")
+            truncated[k] = truncated.get(k, 0) + v
+        return truncated
+
+
+class Profiler:
+    """
+    --profile: where the time went. Rather than timing anything per token,
+    the methods doing each phase of the work get wrapped (per chunk, or per
+    prune or render) and the time between entering and leaving them is
+    added up. Phases are timed exclusively, time spent in a phase entered
+    from inside another counting only toward the inner one
+    """
+
+    def __init__(self, s):
+        # phase -> [wall seconds, cpu seconds, calls], in first-seen order
+        self.phases = {}
+        self.stack = []
+        self.bytesRead = 0
+        self.startWall = self.lastWall = time.perf_counter()
+        self.startCpu = self.lastCpu = time.process_time()
+        if s.profile == "cprofile":
+            import cProfile
+
+            self.cProfile = cProfile.Profile()
+            self.cProfile.enable()
+
+    def switch(self):
+        # charge the time since the last switch to the innermost phase
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if self.stack:
+            phase = self.phases[self.stack[-1]]
+            phase[0] += wall - self.lastWall
+            phase[1] += cpu - self.lastCpu
+        self.lastWall = wall
+        self.lastCpu = cpu
+
+    def enter(self, name):
+        self.switch()
+        self.stack.append(name)
+        self.phases.setdefault(name, [0.0, 0.0, 0])[2] += 1
+
+    def leave(self):
+        self.switch()
+        self.stack.pop()
+
+    def instrument(self, obj, method, name):
+        # replace obj's method with one timed as phase name
+        func = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            self.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.leave()
+
+        setattr(obj, method, timed)
+
+    def iterate(self, name, iterable):
+        # iterable, with the time spent producing each item timed as phase
+        # name. items that are chunks of input get measured up as well
+        iterable = iter(iterable)
+        end = object()
+        while True:
+            self.enter(name)
+            try:
+                item = next(iterable, end)
+            finally:
+                self.leave()
+            if item is end:
+                return
+            if isinstance(item, bytes):
+                self.bytesRead += len(item)
+            yield item
+
+    def report(self, s):
+        # stop the clock before importing anything for the report
+        if s.profile == "cprofile":
+            self.cProfile.disable()
+        self.switch()
+        import resource
+
+        wallTime = self.lastWall - self.startWall
+        cpuTime = self.lastCpu - self.startCpu
+        # whatever wasn't in any phase: parsing --graph input, setting up...
+        otherWall = wallTime - sum(phase[0] for phase in self.phases.values())
+        otherCpu = cpuTime - sum(phase[1] for phase in self.phases.values())
+        self.phases["other"] = [otherWall, otherCpu, 1]
+        # ru_maxrss is kilobytes (on linux). workers count as children
+        peakMemory = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+
+        err = sys.stderr
+        if s.profile == "json":
+            import json
+
+            json.dump(
+                {
+                    "phases": {
+                        name: {
+                            "wall_ms": wall * 1000,
+                            "cpu_ms": cpu * 1000,
+                            "calls": calls,
+                        }
+                        for name, (wall, cpu, calls) in self.phases.items()
+                    },
+                    "wall_ms": wallTime * 1000,
+                    "cpu_ms": cpuTime * 1000,
+                    "bytes_read": self.bytesRead,
+                    "prunes": s.numPrunes,
+                    "peak_memory_kb": peakMemory,
+                },
+                err,
+            )
+            err.write("\n")
+            return
+
+        err.write(f"{'phase':>21}  {'wall ms':>10} {'cpu ms':>10} {'calls':>8}\n")
+        for name, (wall, cpu, calls) in self.phases.items():
+            err.write(
+                f"{name:>21}: {wall * 1000:>10,.2f} {cpu * 1000:>10,.2f} {calls:>8,d}\n"
+            )
+        err.write(
+            f"{'total':>21}: {wallTime * 1000:>10,.2f} {cpuTime * 1000:>10,.2f}\n"
+        )
+        err.write(
+            f"           bytes read: {self.bytesRead:,d} "
+            f"({self.bytesRead / max(wallTime, 1e-9) / 1048576:,.1f}MB/s)\n"
+        )
+        err.write(f"          hash prunes: {s.numPrunes:,d}\n")
+        err.write(f"          peak memory: {peakMemory:,d}KB\n")
+        if s.profile == "cprofile":
+            import pstats
+
+            stats = pstats.Stats(self.cProfile, stream=err)
+            stats.sort_stats("cumulative").print_stats(30)
+
+
+def profiled(s, name, iterable):
+    # iterable as it is, or with the time spent producing each item timed
+    # as phase name if --profile is on
+    if s.profiler is None:
+        return iterable
+    return s.profiler.iterate(name, iterable)
+
+
+class FieldTokenizer(Tokenizer):
+    """
+    Tokenizer for --fields: splits each line into fields, on whitespace like
+    awk does or on --delimiter, and tallies every field (or group of fields,
+    joined into a single key) asked for separately. Lines too short to have
+    a field just don't count toward it
+    """
+
+    def __init__(self, s):
+        super().__init__(s)
+        self.emptyToken = ""
+        self.getters = [itemgetter(*group) for group in s.fields]
+        self.groups = [len(group) > 1 for group in s.fields]
+        # no need to split a line any further than the last field we want
+        lastField = max(max(group) for group in s.fields)
+        self.splitter = methodcaller("split", s.delimiter or None, lastField + 1)
+
+    def split_tokens(self, chunk):
+        # the lines of a chunk, each split into a list of its fields, and
+        # how many lines there were
+        rows = list(map(self.splitter, split_lines(chunk, self.encoding, self.errors)))
+        return rows, len(rows)
+
+    def tally(self, chunk):
+        # like Tokenizer.tally, but returning a tally for each field
+        rows = self.split_tokens(chunk)[0]
+        tallies = []
+        for getter, group in zip(self.getters, self.groups):
+            try:
+                keys = list(map(getter, rows))
+            except IndexError:
+                keys = []
+                for row in rows:
+                    try:
+                        keys.append(getter(row))
+                    except IndexError:
+                        pass
+            if group:
+                keys = list(map(" ".join, keys))
+            tokenDict = self.match_tokens(self.count_tokens(keys))
+            tallies.append((tokenDict, len(keys), sum(tokenDict.values())))
+        return tallies
+
+
+class WeightTokenizer(Tokenizer):
+    """
+    Tokenizer for --weight-field: instead of counting a key once per line,
+    adds up the number in the weight field of every line it's on, as awk's
+    sums[$7] += $10 would. Lines missing either field, or without a number
+    in the weight field (like the - an access log has for no bytes), are
+    skipped
+    """
+
+    def __init__(self, s):
+        super().__init__(s)
+        self.emptyToken = ""
+        # the key field(s), then the weight field
+        self.getter = itemgetter(*s.keyField, s.weightField)
+        self.groupKey = len(s.keyField) > 1
+        self.lastField = max(*s.keyField, s.weightField)
+        self.splitter = methodcaller("split", s.delimiter or None, self.lastField + 1)
+
+    def split_tokens(self, chunk):
+        # a (key, weight) pair for each line, both still text, along with
+        # how many lines there were. each line's split is thrown away as
+        # soon as the two fields are out of it
+        lines = split_lines(chunk, self.encoding, self.errors)
+        try:
+            pairs = list(map(self.getter, map(self.splitter, lines)))
+        except IndexError:
+            rows = map(self.splitter, lines)
+            pairs = [self.getter(row) for row in rows if len(row) > self.lastField]
+        if self.groupKey:
+            pairs = [(" ".join(pair[:-1]), pair[-1]) for pair in pairs]
+        return pairs, len(lines)
+
+    def count_tokens(self, tokens):
+        # sum the weights per key. whole numbers stay ints, so byte counts
+        # print as such. nan and inf aren't numbers anything can add up to
+        tokenDict = {}
+        get = tokenDict.get
+        isfinite = math.isfinite
+        for key, weight in tokens:
+            try:
+                weight = int(weight)
+            except ValueError:
+                try:
+                    weight = float(weight)
+                except ValueError:
+                    continue
+                if not isfinite(weight):
+                    continue
+            tokenDict[key] = get(key, 0) + weight
+        return tokenDict
+
+
+class PatternTokenizer(Tokenizer):
+    """
+    Tokenizer for --pattern: tokens are split and --match'ed as usual, then
+    sorted into the named patterns given. The patterns are compiled into a
+    single alternation of named groups, so each distinct token is matched
+    just once, lastgroup saying which pattern it went to - the first one it
+    matches. Tokens matching none are dropped. Patterns that can't go in an
+    alternation are matched one after another instead
+    """
+
+    def __init__(self, s):
+        super().__init__(s)
+        # tokens are matched as text, even whole lines
+        self.emptyToken = ""
+        import re
+
+        regexps = []
+        for name, regexp in s.patterns:
+            # the same shorthands as --match
+            if regexp == "word":
+                regexp = r"^[A-Z,a-z]+$"
+            elif regexp in ("num", "number"):
+                regexp = r"^\d+$"
+            try:
+                re.compile(regexp)
+            except re.error as e:
+                s.usage_error(f"--pattern={name}={regexp}: {e}")
+            regexps.append(regexp)
+        self.groups = {f"p{n}": n for n in range(len(regexps))}
+
+        # backreferences would refer to the wrong groups once the patterns'
+        # groups are numbered together, and flags would apply to them all
+        self.matcher = None
+        self.patternMatchers = [re.compile(regexp).match for regexp in regexps]
+        unsafe = re.compile(r"\\[1-9]|\(\?P=|^\(\?[aiLmsux]+\)")
+        if not any(unsafe.search(regexp) for regexp in regexps):
+            # the names given needn't be valid group names
+            alternatives = [f"(?P<p{n}>{regexp})" for n, regexp in enumerate(regexps)]
+            try:
+                self.matcher = re.compile("|".join(alternatives)).match
+            except re.error:
+                pass
+
+    def tally(self, chunk):
+        # like Tokenizer.tally, but returning a tally for each pattern
+        tokens, totalObjects = self.split_tokens(chunk)
+        tokenDict = self.match_tokens(self.count_tokens(tokens))
+        patternDicts = [{} for group in self.groups]
+        groups = self.groups
+        matcher = self.matcher
+        if matcher is None:
+            for k, v in tokenDict.items():
+                for n, patternMatcher in enumerate(self.patternMatchers):
+                    if patternMatcher(k) is not None:
+                        patternDicts[n][k] = v
+                        break
+        else:
+            for k, v in tokenDict.items():
+                m = matcher(k)
+                if m is not None:
+                    patternDicts[groups[m.lastgroup]][k] = v
+        return [
+            (patternDict, totalObjects, sum(patternDict.values()))
+            for patternDict in patternDicts
+        ]
+
+
+def split_byte_lines(chunk):
+    # split a chunk on newlines, dropping the empty string after the last one
+    lines = chunk.split(b"\n")
+    if lines[-1] == b"":
+        lines.pop()
+    return lines
+
+
+def split_lines(chunk, encoding, errors):
+    # the same lines iterating over text-mode stdin gives, minus the
+    # newlines (stdin does no newline translation, \r stays put)
+    lines = chunk.decode(encoding, errors).split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def read_chunks(stream, chunkSize):
+    # read a binary stream in large blocks, yielding chunks that always end
+    # on a line boundary (except possibly the very last one)
+    remainder = b""
+    while True:
+        block = stream.read(chunkSize)
+        if not block:
+            break
+        lastNewline = block.rfind(b"\n")
+        if lastNewline < 0:
+            remainder += block
+            continue
+        yield remainder + block[: lastNewline + 1]
+        remainder = block[lastNewline + 1 :]
+    if remainder:
+        yield remainder
+
+
+def read_available(stream, chunkSize, timeout):
+    # like read_chunks, but for input that trickles in (tail -f): yields
+    # whatever complete lines have arrived as soon as they're there, and
+    # None every time timeout seconds pass without anything arriving
+    fd = stream.fileno()
+    remainder = b""
+    while True:
+        if not select.select([fd], [], [], timeout)[0]:
+            yield None
+            continue
+        block = os.read(fd, chunkSize)
+        if not block:
+            break
+        lastNewline = block.rfind(b"\n")
+        if lastNewline < 0:
+            remainder += block
+            continue
+        yield remainder + block[: lastNewline + 1]
+        remainder = block[lastNewline + 1 :]
+    if remainder:
+        yield remainder
+
+
+def open_input(s):
+    # binary stream to read input from: stdin, or the --file given, which
+    # is memory-mapped so reading it doesn't go through read() syscalls
+    if not s.inputFile:
+        return sys.stdin.buffer
+    try:
+        f = open(s.inputFile, "rb")
+    except OSError as e:
+        sys.exit(f"{s.inputFile}: {e.strerror}")
+    if s.refresh or s.window or s.decay or s.numMax or s.rollingMax:
+        # we'll be reading it as it grows
+        return f
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # empty files and non-regular files can't be mapped
+        return f
+
+
+def open_file(path):
+    # binary stream of a file's contents, decompressing it first if its
+    # first few bytes say it's gzip, bzip2, xz or zstd compressed
+    f = open(path, "rb")
+    magic = f.peek(6)[:6]
+    if magic.startswith(b"\x1f\x8b"):
+        import gzip
+
+        return gzip.GzipFile(fileobj=f)
+    if magic.startswith(b"BZh"):
+        import bz2
+
+        return bz2.BZ2File(f)
+    if magic.startswith(b"\xfd7zXZ\x00"):
+        import lzma
+
+        return lzma.LZMAFile(f)
+    if magic.startswith(b"\x28\xb5\x2f\xfd"):
+        # python 3.14 has zstd built in, before that it's the zstandard module
+        try:
+            from compression import zstd
+
+            return zstd.ZstdFile(f)
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            sys.exit(f"{path} is zstd-compressed, which needs zstandard installed")
+        return zstandard.ZstdDecompressor().stream_reader(f)
+    return f
+
+
+def read_files(paths, chunkSize, ahead):
+    # read_chunks of each file in turn, decompressed as need be. the next
+    # ahead files are read (and decompressed) concurrently by threads, which
+    # works because zlib, bz2 and lzma let go of the GIL while they work, each
+    # thread handing over its chunks through a short queue
+    import queue
+    import threading
+
+    def fill(path, chunks):
+        # anything going wrong gets passed on to be raised by the reader
+        try:
+            for chunk in read_chunks(open_file(path), chunkSize):
+                chunks.put(chunk)
+        except BaseException as e:
+            chunks.put(e)
+        chunks.put(None)
+
+    def start(path):
+        chunks = queue.Queue(2)
+        threading.Thread(target=fill, args=(path, chunks), daemon=True).start()
+        return chunks
+
+    def drain(path, chunks):
+        # a file that's missing, unreadable, corrupt or cut short ends it
+        # all with a message rather than a traceback
+        for chunk in iter(chunks.get, None):
+            if isinstance(chunk, bytes):
+                yield chunk
+            elif isinstance(chunk, Exception):
+                sys.exit(f"{path}: {getattr(chunk, 'strerror', None) or chunk}")
+            else:
+                raise chunk
+
+    pending = deque()
+    for path in paths:
+        pending.append((path, start(path)))
+        if len(pending) >= ahead:
+            yield from drain(*pending.popleft())
+    while pending:
+        yield from drain(*pending.popleft())
+
+
+def read_input(s, live=False, timeout=None):
+    # line-aligned chunks of input: the files given on the command line, or
+    # stdin (or --file). live, stdin is read as input arrives, with a None
+    # every timeout seconds nothing does, see read_available
+    if s.files and not s.mergeStates:
+        return read_files(s.files, s.chunkSize, min(os.cpu_count() or 1, 8))
+    if live:
+        return read_available(open_input(s), s.chunkSize, timeout)
+    return read_chunks(open_input(s), s.chunkSize)
+
+
+def read_sources(s, timeout):
+    # --listen, or files given along with --follow: every source is read at
+    # once by asyncio, in a thread of its own, and this yields (source,
+    # chunk) pairs as they arrive - or None every timeout seconds nothing
+    # does. the queue in between is short, so while counting falls behind
+    # the sources aren't read any further, and a socket's writers are kept
+    # waiting. there's no end to any of it, until a ^C or a TERM
+    import asyncio
+    import queue
+    import signal
+    import threading
+
+    chunks = queue.Queue(8)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    async def pump(source, read):
+        # read blocks from source, passing on the complete lines in them
+        remainder = b""
+        while True:
+            block = await read()
+            if not block:
+                break
+            lastNewline = block.rfind(b"\n")
+            if lastNewline < 0:
+                remainder += block
+                continue
+            chunk = remainder + block[: lastNewline + 1]
+            remainder = block[lastNewline + 1 :]
+            await asyncio.to_thread(chunks.put, (source, chunk))
+        if remainder:
+            await asyncio.to_thread(chunks.put, (source, remainder))
+
+    def tail(path):
+        # a read for pump that's like tail -F from the start of the file:
+        # once at the end, wait for more, and start over if it's truncated.
+        # if it's replaced, whatever was written to the old one before then
+        # is read first, and a file not there (yet, or for now) is waited for
+        f = None
+        replaced = False
+
+        async def read():
+            nonlocal f, replaced
+            while True:
+                if f is None:
+                    try:
+                        f = open(path, "rb")
+                    except OSError:
+                        await asyncio.sleep(0.25)
+                        continue
+                block = f.read(s.chunkSize)
+                if block:
+                    return block
+                if replaced:
+                    f.close()
+                    f = None
+                    replaced = False
+                    continue
+                await asyncio.sleep(0.25)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_ino != os.fstat(f.fileno()).st_ino:
+                    replaced = True
+                elif stat.st_size < f.tell():
+                    f.seek(0)
+
+        return read
+
+    def listener(address):
+        # a connection handler for the source at address, [host:]port or
+        # unix:path, each connection's lines going under its name
+        async def handle(reader, writer):
+            await pump(address, lambda: reader.read(s.chunkSize))
+            writer.close()
+
+        if address.startswith("unix:"):
+            return asyncio.start_unix_server(handle, address[5:])
+        host, _, port = address.rpartition(":")
+        return asyncio.start_server(handle, host or "127.0.0.1", int(port))
+
+    async def serve():
+        servers = [await listener(address) for address in s.listen]
+        await asyncio.gather(
+            *(server.serve_forever() for server in servers),
+            *(pump(path, tail(path)) for path in s.files),
+        )
+
+    def run():
+        # anything going wrong over there is raised over here
+        try:
+            asyncio.run(serve())
+        except BaseException as e:
+            chunks.put(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        try:
+            item = chunks.get(timeout=timeout)
+        except queue.Empty:
+            yield None
+            continue
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def pool_imap(pool, func, iterable, maxPending):
+    # like pool.imap, but never reads more than maxPending items ahead of
+    # what has been consumed, otherwise we'd pull all of stdin into memory
+    # as fast as the pipe can deliver it
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= maxPending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+# saved counter state: the magic line, then sections of a 4-byte tag, an
+# 8-byte little-endian length and that many bytes of payload. readers skip
+# sections they don't know. META is json, KEYS is zlib-compressed records of
+# key length, key bytes, count and (if there are error bounds) error, and
+# the optional "HLL " section is the distinct-key sketch, see HyperLogLog
+STATE_MAGIC = b"distribution-state 1\n"
+
+
+def save_state(s, path, tokenDict, errorDict, dropped):
+    import json
+    import zlib
+
+    # the compact counter only names its highest keys, and the others it
+    # counted can have as much as the lowest named count - which is what
+    # merging a state with error bounds allows for keys missing from it
+    keyStore = s.keyStore
+    if errorDict is None and keyStore is not None:
+        if keyStore.numKeys > len(tokenDict):
+            errorDict = dict.fromkeys(tokenDict, 0)
+
+    countScale = s.countScale
+    countType = "q"
+    if countScale != 1 or any(isinstance(v, float) for v in tokenDict.values()):
+        countType = "d"
+    recordFormat = "<I" + countType * (1 if errorDict is None else 2)
+
+    records = []
+    for k, v in tokenDict.items():
+        key = k if isinstance(k, bytes) else k.encode(s.encoding, "surrogateescape")
+        if errorDict is None:
+            record = struct.pack(recordFormat, len(key), v * countScale)
+        else:
+            record = struct.pack(
+                recordFormat, len(key), v * countScale, errorDict[k] * countScale
+            )
+        records.append(record + key)
+
+    meta = {
+        "totalObjects": s.totalObjects,
+        "totalValues": s.totalValues * countScale,
+        "numPrunes": s.numPrunes,
+        "counter": s.counter,
+        "countType": countType,
+        "errors": errorDict is not None,
+        "dropped": dropped,
+    }
+    sections = [
+        (b"META", json.dumps(meta).encode()),
+        (b"KEYS", zlib.compress(b"".join(records), 1)),
+    ]
+    if s.distinct is not None:
+        # the precision, then the registers
+        sections.append(
+            (b"HLL ", bytes([s.distinct.precision]) + s.distinct.registers)
+        )
+    with open(path, "wb") as f:
+        f.write(STATE_MAGIC)
+        for tag, payload in sections:
+            f.write(tag + struct.pack("<Q", len(payload)) + payload)
+
+
+def load_state(s, path):
+    # returns the META dict, a tokenDict, an errorDict (None if the saved
+    # counter kept no error bounds) and a HyperLogLog (None if there's no
+    # distinct-key sketch saved)
+    import json
+    import zlib
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(STATE_MAGIC):
+        raise ValueError(f"{path} is not a saved distribution state")
+
+    # a truncated or garbled state fails one way or another in here
+    try:
+        sections = {}
+        offset = len(STATE_MAGIC)
+        while offset < len(data):
+            tag = data[offset : offset + 4]
+            (length,) = struct.unpack_from("<Q", data, offset + 4)
+            sections[tag] = data[offset + 12 : offset + 12 + length]
+            if len(sections[tag]) < length:
+                raise ValueError(f"{tag} section cut short")
+            offset += 12 + length
+
+        meta = json.loads(sections[b"META"])
+        meta["dropped"] = bool(meta["dropped"])
+        records = zlib.decompress(sections[b"KEYS"])
+        recordFormat = "<I" + meta["countType"] * (2 if meta["errors"] else 1)
+        recordSize = struct.calcsize(recordFormat)
+        unpack = struct.Struct(recordFormat).unpack_from
+
+        tokenDict = {}
+        errorDict = {} if meta["errors"] else None
+        offset = 0
+        while offset < len(records):
+            fields = unpack(records, offset)
+            offset += recordSize
+            key = records[offset : offset + fields[0]].decode(
+                s.encoding, "surrogateescape"
+            )
+            offset += fields[0]
+            tokenDict[key] = fields[1]
+            if errorDict is not None:
+                errorDict[key] = fields[2]
+
+        distinct = None
+        if b"HLL " in sections:
+            distinct = HyperLogLog(sections[b"HLL "][0])
+            distinct.registers = bytearray(sections[b"HLL "][1:])
+    except (KeyError, IndexError, TypeError, ValueError, struct.error, zlib.error):
+        raise ValueError(f"{path} is corrupt") from None
+    return meta, tokenDict, errorDict, distinct
+
+
+def state_has_errors(path):
+    # whether a saved state has error bounds, going by its META section
+    # alone (the first one saved) rather than loading all of it
+    import json
+
+    with open(path, "rb") as f:
+        if f.read(len(STATE_MAGIC)) != STATE_MAGIC:
+            return False
+        while True:
+            header = f.read(12)
+            if len(header) < 12:
+                return False
+            (length,) = struct.unpack("<Q", header[4:])
+            if header[:4] == b"META":
+                try:
+                    return bool(json.loads(f.read(length)).get("errors"))
+                except ValueError:
+                    return False
+            f.seek(length, 1)
+
+
+class InputReader:
+    """
+    Reads stdin, parses it into a dictionary of key and value is number
+    of appearances of that key in the input - the counting itself is done
+    by a PruningCounter, which prunes the token frequency dict after a
+    certain number of insertions to prevent OOME on large datasets, or a
+    SpaceSaving counter, which never holds more than maxKeys keys
+    """
+
+    def __init__(self, s):
+        if s.window:
+            self.counter = SlidingWindow(s)
+        elif s.counter == "spacesaving":
+            self.counter = SpaceSaving(s)
+        elif s.counter == "compact":
+            self.counter = CompactCounter(s)
+            s.keyStore = self.counter
+        else:
+            self.counter = PruningCounter(s)
+        if s.decay:
+            self.counter = ExponentialDecay(s, self.counter)
+        self.tokenDict = self.counter.tokenDict
+        self.errorDict = self.counter.errorDict
+        # the highest-counted keys, kept up to date as we go in live mode
+        self.liveTop = []
+        # matched tokens merged since the last prune
+        self.pruneObjects = 0
+        # --fields or --pattern: a (settings, reader) pair for each field or
+        # pattern, see read_sections
+        self.sectionReaders = []
+        # how many distinct keys there have been, pruned or not. only
+        # worth the hashing if it's going to be shown or saved
+        if s.verbose or s.saveState:
+            s.distinct = HyperLogLog(portable=bool(s.saveState))
+        self.sampler = None
+        if s.sampleRate or s.reservoirSize:
+            self.sampler = LineSampler(s)
+
+    def tick(self, s):
+        # let the counter expire or decay counts. windowed counts can go
+        # down, which is the one time liveTop has to be found from scratch
+        if self.counter.tick(s) and s.refresh:
+            self.liveTop = top_keys(self.tokenDict, s.height + 1)
+
+    def update_live_top(self, s, touched):
+        # counts otherwise only ever go up, so the new top keys are among the old top
+        # keys and the ones whose counts just changed - no need to look at
+        # the rest of tokenDict. keys pruned or evicted meanwhile drop out
+        ourDict = self.tokenDict
+        candidates = ourDict.keys() & touched
+        candidates.update(k for k in self.liveTop if k in ourDict)
+        self.liveTop = [
+            k
+            for v, k in heapq.nlargest(
+                s.height + 1, zip(map(ourDict.__getitem__, candidates), candidates)
+            )
+        ]
+
+    def merge_tallies(self, s, tallies, h=None):
+        # merge a stream of chunk tallies, in input order so the counts are
+        # the same however many processes did the tokenizing. in live mode a
+        # tally can also be None, meaning no input arrived for a while
+        nextStat = time.time() + s.statInterval
+        nextDraw = time.time() + s.refresh
+        for tally in tallies:
+            self.tick(s)
+            if s.refresh and time.time() >= nextDraw:
+                h.redraw(s, self.tokenDict, self.errorDict, self.liveTop)
+                nextDraw = time.time() + s.refresh
+            if tally is None:
+                continue
+
+            self.merge_tally(s, tally)
+            if s.refresh:
+                self.update_live_top(s, tally[0])
+            elif s.verbose and time.time() > nextStat:
+                sys.stderr.write(
+                    f"tokens/lines examined: {s.totalObjects:,d} ; hash prunes: {s.numPrunes:,d}..."
+                    + chr(13)
+                )
+                nextStat = time.time() + s.statInterval
+        self.tick(s)
+
+    def merge_tally(self, s, tally):
+        # fold one chunk's tally into the counter
+        tokenDict, totalObjects, totalValues = tally
+        s.totalObjects += totalObjects
+        # summed weights can be any size, so those prune by lines instead
+        if s.weightField is not None:
+            self.pruneObjects += totalObjects
+        else:
+            self.pruneObjects += totalValues
+        if s.distinct is not None:
+            s.distinct.update(tokenDict, s.encoding)
+        if not s.memoryBudget:
+            self.counter.merge(s, tokenDict, totalValues)
+            # prune the hash if it gets too large
+            if self.pruneObjects >= s.keyPruneInterval:
+                self.counter.prune_keys(s)
+                self.pruneObjects = 0
+            return
+
+        # prune by how much memory the counts take up instead, a step at a
+        # time, timing each step. a chunk's keys alone can take up more than
+        # the whole budget, so they go in a slice at a time, each a quarter of
+        # the budget at most (or a histogram's worth of keys) going by how
+        # much the counts grew per key so far, and after each the counts are
+        # pruned to what leaves room for the next. the peak is what they
+        # reached before they were pruned
+        sliceBudget = s.memoryBudget / 4
+        keyBytes = dict_memory(tokenDict) / max(len(tokenDict), 1)
+        items = iter(tokenDict.items())
+        numLeft = len(tokenDict)
+        while True:
+            perSlice = max(int(sliceBudget / max(keyBytes, 1)), s.height)
+            if perSlice >= numLeft == len(tokenDict):
+                piece = tokenDict
+            else:
+                piece = dict(islice(items, perSlice))
+            numLeft -= len(piece)
+            used = self.counter.memory()
+            self.counter.merge(s, piece, totalValues)
+            totalValues = 0
+            grown = self.counter.memory() - used
+            keyBytes = max(keyBytes, grown / max(len(piece), 1))
+            s.memoryPeak = max(s.memoryPeak, used + grown)
+            startTime = time.perf_counter()
+            if self.counter.trim(s, s.memoryBudget - sliceBudget):
+                s.prunePauses.append(time.perf_counter() - startTime)
+            if not numLeft:
+                break
+
+    def tokenize_input(self, s, h=None):
+        if s.weightField is not None:
+            tokenizer = WeightTokenizer(s)
+        else:
+            tokenizer = Tokenizer(s)
+        if s.profiler is not None and s.jobs == 1:
+            # (workers' time can only be seen from here as time waiting)
+            s.profiler.instrument(tokenizer, "split_tokens", "split")
+            s.profiler.instrument(tokenizer, "count_tokens", "count")
+            s.profiler.instrument(tokenizer, "match_tokens", "match")
+        if s.listen or s.follow and s.files:
+            # several sources at once, which only end when we're stopped
+            sources = profiled(s, "read", read_sources(s, s.refresh or None))
+            try:
+                self.merge_tallies(s, self.tally_sources(s, tokenizer, sources), h)
+            except KeyboardInterrupt:
+                pass
+            return
+        if s.refresh or s.window or s.decay:
+            # live mode: tally whatever has arrived and redraw the histogram
+            # every refresh seconds until the input ends. time windows need
+            # the same, since input counts from when it arrives
+            chunks = read_input(s, True, s.refresh or None)
+            chunks = self.sample_chunks(s, profiled(s, "read", chunks))
+            self.merge_tallies(
+                s,
+                (tokenizer.tally(c) if c is not None else None for c in chunks),
+                h,
+            )
+            return
+        chunks = self.sample_chunks(s, profiled(s, "read", read_input(s)))
+        if s.jobs > 1:
+            # hand line-aligned chunks to a pool of worker processes, each of
+            # which tokenizes and counts its chunk locally
+            import multiprocessing
+
+            with multiprocessing.Pool(s.jobs) as pool:
+                tallies = pool_imap(pool, tokenizer.tally, chunks, s.jobs * 2)
+                self.merge_tallies(s, profiled(s, "workers", tallies))
+        else:
+            self.merge_tallies(s, map(tokenizer.tally, chunks))
+
+    def sample_chunks(self, s, chunks):
+        # --sample or --reservoir: the chunks with only the lines sampled left
+        # in them, see LineSampler
+        if s.reservoirSize:
+            return self.sampler.fill(s, chunks)
+        if s.sampleRate:
+            return (
+                self.sampler.sample(s, c) if c is not None else None for c in chunks
+            )
+        return chunks
+
+    def tally_sources(self, s, tokenizer, sources):
+        # tally the chunks from read_sources, with --tag-source putting the
+        # name of the source each came from in front of its keys. there's no
+        # end to them for a reservoir to be counted at, but --sample works
+        for item in sources:
+            if item is None:
+                yield None
+                continue
+            source, chunk = item
+            if s.sampleRate:
+                chunk = self.sampler.sample(s, chunk)
+            tokenDict, totalObjects, totalValues = tokenizer.tally(chunk)
+            if s.tagSource:
+                prefix = source + ": "
+                if tokenizer.emptyToken == b"":
+                    prefix = prefix.encode(s.encoding, "surrogateescape")
+                tokenDict = {prefix + k: v for k, v in tokenDict.items()}
+            yield tokenDict, totalObjects, totalValues
+
+    def read_fields(self, s):
+        # --fields: one pass over the input, counting each field (or group
+        # of fields) with a reader of its own
+        self.read_sections(s, FieldTokenizer(s), len(s.fields))
+
+    def read_patterns(self, s):
+        # --pattern: one pass over the input, counting the tokens each
+        # pattern matches with a reader of its own
+        self.read_sections(s, PatternTokenizer(s), len(s.patterns))
+
+    def read_sections(self, s, tokenizer, numSections):
+        # tokenizer.tally gives a tally for each of numSections sections, each
+        # counted by a reader of its own. each gets a copy of the settings
+        # too, for totals (and percentages) of its own
+        for n in range(numSections):
+            sectionSettings = copy.copy(s)
+            sectionSettings.totalObjects = 0
+            sectionSettings.totalValues = 0
+            sectionSettings.numPrunes = 0
+            # the memory budget is shared out between the sections
+            sectionSettings.memoryBudget = s.memoryBudget // numSections
+            sectionSettings.memoryPeak = 0
+            sectionSettings.prunePauses = []
+            reader = InputReader(sectionSettings)
+            if s.profiler is not None:
+                s.profiler.instrument(reader.counter, "merge", "merge")
+                s.profiler.instrument(reader.counter, "prune_keys", "prune")
+                s.profiler.instrument(reader.counter, "trim", "prune")
+            self.sectionReaders.append((sectionSettings, reader))
+        if s.profiler is not None and s.jobs == 1:
+            s.profiler.instrument(tokenizer, "split_tokens", "split")
+            s.profiler.instrument(tokenizer, "count_tokens", "count")
+            s.profiler.instrument(tokenizer, "match_tokens", "match")
+
+        chunks = self.sample_chunks(s, profiled(s, "read", read_input(s)))
+        if s.jobs > 1:
+            import multiprocessing
+
+            with multiprocessing.Pool(s.jobs) as pool:
+                tallies = pool_imap(pool, tokenizer.tally, chunks, s.jobs * 2)
+                self.merge_section_tallies(profiled(s, "workers", tallies))
+        else:
+            self.merge_section_tallies(map(tokenizer.tally, chunks))
+        # the sampling was done for all the sections at once
+        for sectionSettings, reader in self.sectionReaders:
+            sectionSettings.linesSeen = s.linesSeen
+            sectionSettings.linesSampled = s.linesSampled
+            sectionSettings.sampleScale = sectionSettings.countScale = s.sampleScale
+
+    def merge_section_tallies(self, tallies):
+        # each item of tallies has a tally per section, in order
+        for sectionTallies in tallies:
+            for (sectionSettings, reader), tally in zip(
+                self.sectionReaders, sectionTallies
+            ):
+                reader.tick(sectionSettings)
+                reader.merge_tally(sectionSettings, tally)
+        for sectionSettings, reader in self.sectionReaders:
+            reader.tick(sectionSettings)
+
+    def read_bins(self, s):
+        # --bins: count numeric lines into buckets, see NumericBins
+        self.bins = NumericBins(s)
+        if s.profiler is not None:
+            s.profiler.instrument(self.bins, "update", "count")
+        for chunk in profiled(s, "read", read_input(s)):
+            lines = split_byte_lines(chunk)
+            s.totalObjects += len(lines)
+            s.totalValues += self.bins.update(lines)
+
+    def read_states(self, s):
+        # combine counter states saved with --save-state, one file at a time
+        dropped = False
+        for n, path in enumerate(s.files):
+            meta, tokenDict, errorDict, distinct = load_state(s, path)
+            # the distinct-key estimate is only any good if every state
+            # has a sketch to merge
+            if distinct is None:
+                s.distinct = None
+            elif n == 0:
+                s.distinct = distinct
+            elif s.distinct is not None:
+                s.distinct.merge(distinct)
+            s.totalObjects += meta["totalObjects"]
+            s.numPrunes += meta["numPrunes"]
+            self.merge_counts(
+                s, tokenDict, errorDict, meta["totalValues"], meta["dropped"], dropped
+            )
+            dropped = dropped or meta["dropped"]
+        self.tick(s)
+
+    def keys_dropped(self, s):
+        # whether keys counted may be missing from tokenDict: evicted by a
+        # full Space-Saving counter, trimmed to --memory or, in the compact
+        # counter, left unnamed
+        if len(self.tokenDict) >= s.maxKeys or s.numPrunes:
+            return True
+        keyStore = s.keyStore
+        return keyStore is not None and keyStore.numKeys > len(self.tokenDict)
+
+    def merge_counts(
+        self, s, tokenDict, errorDict, totalValues, theyDropped, weDropped=False
+    ):
+        # fold in counts from elsewhere (a saved state, another counter),
+        # errorDict being their error bounds or None if they're exact. with
+        # error bounds, a key missing from counts that may have dropped keys
+        # may have been one of those, with as much as their lowest count -
+        # and the same goes for a key missing from ours, if ours has been
+        # merged with counts that dropped keys or is full and evicting
+        ourErrors = self.errorDict
+        if ourErrors is None:
+            self.counter.merge(s, tokenDict, totalValues)
+            return
+        ourMin = 0
+        if weDropped or len(self.tokenDict) >= s.maxKeys:
+            ourMin = min(self.tokenDict.values(), default=0)
+        stateMin = 0
+        if errorDict is not None and theyDropped:
+            stateMin = min(tokenDict.values(), default=0)
+        ourKeys = set(self.tokenDict)
+        self.counter.merge(s, tokenDict, totalValues)
+        # a key's error bounds from each side add up
+        for k in ourErrors:
+            if k not in tokenDict:
+                ourErrors[k] += stateMin
+                continue
+            if errorDict is not None:
+                ourErrors[k] += errorDict[k]
+            if k not in ourKeys:
+                ourErrors[k] += ourMin
+
+    def read_pretallied_tokens(self, s):
+        # the input is already just a series of keys with the frequency of the
+        # keys precomputed, as in "du -sb" - vk means the number is first, key
+        # second. kv means key first, number second
+        import re
+
+        if s.graphValues == "vk":
+            pattern = re.compile(r"^\s*(\d+)\s+(.+)$")
+            keyGroup, valueGroup = 2, 1
+            otherOrder = "kv"
+        elif s.graphValues == "kv":
+            pattern = re.compile(r"^(.+?)\s+(\d+)$")
+            keyGroup, valueGroup = 1, 2
+            otherOrder = "vk"
+        else:
+            return
+
+        for chunk in profiled(s, "read", read_input(s)):
+            # tally each chunk on its own, then hand it to the counter
+            tokenDict = {}
+            totalValues = 0
+            for line in split_lines(chunk, s.encoding, s.encodingErrors):
+                m = pattern.match(line)
+                try:
+                    key = m.group(keyGroup)
+                    value = int(m.group(valueGroup))
+                    tokenDict[key] = tokenDict.get(key, 0) + value
+                    totalValues += value
+                    s.totalObjects += 1
+                except Exception:
+                    sys.stderr.write(
+                        f" E Input malformed+discarded (perhaps pass -g={otherOrder}?): {line}\n\n"
+                    )
+            self.tick(s)
+            if s.distinct is not None:
+                s.distinct.update(tokenDict, s.encoding)
+            self.counter.merge(s, tokenDict, totalValues)
+        self.tick(s)
+
+    def read_numerics(self, s, h):
+        # in this special mode, we print out the histogram here instead
+        # of later - because it's a far simpler histogram without all the
+        # totals, percentages, etc of the real histogram. we're just
+        # showing a graph of a series of numbers
+        if s.numMax or s.rollingMax:
+            return self.stream_numerics(s, h)
+
+        lastVal = 0
+        maxVal = 0
+        maxWidth = 0
+        sumVal = 0
+        # every value has to be kept until the end to know the scale, so
+        # keep them as packed doubles rather than a list of float objects
+        outList = array("d")
+        for chunk in profiled(s, "read", read_input(s)):
+            # float() takes bytes and ignores surrounding whitespace, so the
+            # lines never need decoding
+            for line in split_byte_lines(chunk):
+                try:
+                    line = float(line)
+                except Exception:
+                    line = lastVal
+
+                graphVal = 0
+                if s.numOnly == "mon":
+                    if s.totalObjects > 0:
+                        graphVal = line - lastVal
+                    lastVal = line
+                else:
+                    graphVal = line
+
+                if graphVal > maxVal:
+                    maxVal = graphVal
+                    maxWidth = len(str(graphVal))
+
+                sumVal += int(graphVal)
+
+                if s.totalObjects > 0:
+                    outList.append(graphVal)
+                s.totalObjects += 1
+
+        h.write_numerics(s, outList, maxVal, maxWidth, sumVal)
+
+    def stream_numerics(self, s, h):
+        # --numonly with a known scale: either the fixed --max, or the
+        # largest of the last --rolling-max values. rows are written as soon
+        # as their chunk of input arrives and nothing is kept beyond the
+        # rolling window, so memory stays constant however long the stream
+        # the key column is as wide as --max, or the widest of the first
+        # rows to --rolling-max, and stays that wide: bars keep the same scale
+        # and rows stay lined up, values too wide for it being clamped
+        lastVal = 0
+        maxWidth = max(len(str(int(s.numMax))), 3) if s.numMax else 0
+        # (index, value) pairs with decreasing values, the head being the
+        # max of the window - each value goes in and out once
+        window = deque()
+        for chunk in profiled(s, "read", read_input(s, True)):
+            values = array("d")
+            rowMaxes = array("d") if s.rollingMax else None
+            for line in split_byte_lines(chunk):
+                try:
+                    line = float(line)
+                except Exception:
+                    line = lastVal
+
+                graphVal = 0
+                if s.numOnly == "mon":
+                    if s.totalObjects > 0:
+                        graphVal = line - lastVal
+                    lastVal = line
+                else:
+                    graphVal = line
+
+                if s.totalObjects > 0:
+                    values.append(graphVal)
+                    if rowMaxes is not None:
+                        while window and window[-1][1] <= graphVal:
+                            window.pop()
+                        window.append((s.totalObjects, graphVal))
+                        if window[0][0] <= s.totalObjects - s.rollingMax:
+                            window.popleft()
+                        rowMaxes.append(window[0][1])
+                s.totalObjects += 1
+
+            if not maxWidth and values:
+                maxWidth = max(max(len(str(int(v))) for v in values), 3)
+            h.write_numerics(s, values, s.numMax, maxWidth, s.numMax, rowMaxes, True)
+            sys.stdout.flush()
+
+
+# options that are given on their own: option -> (attribute, value it's set to)
+FLAG_OPTIONS = {
+    "-c": ("colourisedOutput", True),
+    "--color": ("colourisedOutput", True),
+    "--colour": ("colourisedOutput", True),
+    # can pass --graph without option, will default to value/key ordering
+    # since Unix prefers that for piping-to-sort reasons
+    "-g": ("graphValues", "vk"),
+    "--graph": ("graphValues", "vk"),
+    "-l": ("logarithmic", True),
+    "--logarithmic": ("logarithmic", True),
+    "-n": ("numOnly", "abs"),
+    "--numonly": ("numOnly", "abs"),
+    "-v": ("verbose", True),
+    "--verbose": ("verbose", True),
+    "--follow": ("follow", True),
+    "--tag-source": ("tagSource", True),
+    "--merge": ("mergeStates", True),
+    "--bins": ("bins", "hdr"),
+    "--profile": ("profile", "text"),
+}
+
+# options given as option=value: option -> (attribute, function turning the
+# value into what the attribute is set to)
+VALUE_OPTIONS = {
+    "-w": ("widthArg", int),
+    "--width": ("widthArg", int),
+    "-h": ("heightArg", int),
+    "--height": ("heightArg", int),
+    "-k": ("maxKeys", int),
+    "--keys": ("maxKeys", int),
+    "--counter": ("counter", str),
+    "--window": ("window", parse_duration),
+    "--window-buckets": ("windowBuckets", int),
+    "--decay": ("decay", parse_duration),
+    "--save-state": ("saveState", os.path.expanduser),
+    "--bins": ("bins", str),
+    "--profile": ("profile", str),
+    "--max": ("numMax", float),
+    "--rolling-max": ("rollingMax", int),
+    "--refresh": ("refresh", float),
+    "--file": ("inputFile", os.path.expanduser),
+    "--fields": ("fields", parse_fields),
+    "--delimiter": ("delimiter", str),
+    "--max-key-len": ("maxKeyLen", int),
+    "--memory": ("memoryBudget", parse_size),
+    "--sample": ("sampleRate", float),
+    "--reservoir": ("reservoirSize", int),
+    "--key-field": ("keyField", lambda value: parse_fields(value)[0]),
+    "--weight-field": ("weightField", parse_field),
+    # zero means one per cpu
+    "-j": ("jobs", lambda value: int(value) or os.cpu_count() or 1),
+    "--jobs": ("jobs", lambda value: int(value) or os.cpu_count() or 1),
+    "-c": ("histogramChar", str),
+    "--char": ("histogramChar", str),
+    "-g": ("graphValues", str),
+    "--graph": ("graphValues", str),
+    "-n": ("numOnly", str),
+    "--numonly": ("numOnly", str),
+    "-s": ("size", str),
+    "--size": ("size", str),
+    "-t": ("tokenize", str),
+    "--tokenize": ("tokenize", str),
+    "-m": ("matchRegexp", str),
+    "--match": ("matchRegexp", str),
+}
+
+
+def read_rcfile(rcFile):
+    # the options in an rc file, one per line, minus comments
+    try:
+        with open(rcFile) as f:
+            rcfileOptList = f.readlines()
+    except OSError:
+        # don't die or in fact do anything if rcfile doesn't exist
+        return []
+    options = []
+    for rcOpt in rcfileOptList:
+        rcOpt = rcOpt.rstrip().split("#")[0]
+        if rcOpt:
+            options.append(rcOpt)
+    return options
+
+
+class Settings:
+    def __init__(self, argv=None):
+        # argv is the options (and files) to use, without the script name.
+        # by default that's the command line, preceded by the rc file
+        self.totalMillis = 0
+        self.startTime = int(time.time() * 1000)
+        self.endTime = 0
+        self.widthArg = 0
+        self.heightArg = 0
+        self.width = 80
+        self.height = 15
+        self.histogramChar = "-"
+        self.colourisedOutput = False
+        self.logarithmic = False
+        self.numOnly = "XXX"
+        self.verbose = False
+        self.graphValues = ""
+        self.size = ""
+        self.tokenize = ""
+        # by default, everything matches (nothing is stripped out)
+        self.matchRegexp = "."
+        # how often to give status if verbose
+        self.statInterval = 1.0
+        self.numPrunes = 0
+        # number of worker processes to tokenize with, and how much input
+        # to hand each of them at a time
+        self.jobs = 1
+        self.chunkSize = 4 * 1024 * 1024
+        # windowed counting: only the last window seconds of input count,
+        # or (decay) older input counts exponentially less
+        self.window = 0.0
+        self.windowBuckets = 10
+        self.decay = 0.0
+        # what stored counts get multiplied by for display
+        self.countScale = 1
+        # live mode: redraw the histogram every refresh seconds
+        self.follow = False
+        self.refresh = 0.0
+        # --sample: count each line with this probability, or --reservoir: a
+        # uniform sample of this many lines. counts are scaled up by
+        # sampleScale, and how many lines were read and sampled is kept
+        self.sampleRate = None
+        self.reservoirSize = None
+        self.sampleScale = 1
+        self.linesSeen = 0
+        self.linesSampled = 0
+        # sockets to read input from as well, [host:]port or unix:path, and
+        # whether keys get the name of their source (or file) in front
+        self.listen = []
+        self.tagSource = False
+        # streaming --numonly: scale bars to this fixed max, or to the max
+        # of the last rollingMax values, instead of reading everything first
+        self.numMax = 0.0
+        self.rollingMax = 0
+        # --bins: count numeric input into fixed-width (binWidth), log or
+        # hdr buckets
+        self.bins = ""
+        self.binWidth = 0.0
+        # write the counter state out here when done, or merge the states
+        # in files instead of reading input
+        self.saveState = ""
+        self.mergeStates = False
+        # sketch of how many distinct keys the input had, see HyperLogLog
+        self.distinct = None
+        # the counter, when it's a CompactCounter
+        self.keyStore = None
+        # cut tokens longer than this down to size, 0 to leave them be
+        self.maxKeyLen = 0
+        # --fields: count these (0-based) fields of each line, split on
+        # delimiter (whitespace if empty), as groups - a group of more than
+        # one field is counted as a single key
+        self.fields = []
+        self.delimiter = ""
+        # --pattern: (name, regexp) pairs, tokens counted under the first
+        # one they match
+        self.patterns = []
+        # --weight-field: sum this (0-based) field per key rather than
+        # counting lines, the key being the keyField group
+        self.keyField = (0,)
+        self.weightField = None
+        # --profile report format (text, json or cprofile), see Profiler
+        self.profile = ""
+        self.profiler = None
+        # read from this file instead of stdin, and how input gets decoded
+        self.inputFile = ""
+        self.encoding = (sys.stdin and sys.stdin.encoding) or "utf-8"
+        self.encodingErrors = (sys.stdin and sys.stdin.errors) or "strict"
+        # counting engine: prune (exact dict, periodically pruned) or
+        # spacesaving (bounded heavy-hitter counter with error bounds)
+        self.counter = "prune"
+        # for colourised output
+        self.colourPalette = "0,0,32,35,34"
+        self.regularColour = ""
+        self.keyColour = ""
+        self.ctColour = ""
+        self.pctColour = ""
+        self.graphColour = ""
+        # for stats
+        self.totalObjects = 0
+        self.totalValues = 0
+        # every keyPruneInterval keys, prune the hash to maxKeys top keys
+        self.keyPruneInterval = 1500000
+        self.maxKeys = 5000
+        # or with --memory, prune to keep the counts to memoryBudget bytes,
+        # see PruningCounter.trim. how long each step of that took
+        self.memoryBudget = 0
+        self.memoryPeak = 0
+        self.prunePauses = []
+        # for advanced graphing
+        self.unicodeMode = False
+        self.charWidth = 1
+        self.graphChars = []
+        self.partialBlocks = ["▏", "▎", "▍", "▌", "▋", "▊", "▉", "█"]  # char=pb
+        self.partialLines = ["╸", "╾", "━"]  # char=hl
+
+        # options given directly (as by TokenCounter) are a ValueError when
+        # they're bad, rather than exiting with a usage message
+        self.commandLine = argv is None
+        if argv is None:
+            argv = sys.argv[1:]
+            # rcfile grabbing/parsing if specified
+            if len(argv) > 0 and "--rcfile" in argv[0]:
+                rcFile = argv[0].split("=")[1]
+                rcFile = os.path.expanduser(rcFile)
+            else:
+                rcFile = os.environ.get("HOME") + "/.distributionrc"
+        else:
+            rcFile = None
+
+        # anything on the commandline that isn't an option is a file
+        self.files = [arg for arg in argv if not arg.startswith("-")]
+
+        # parse opts from the rcFile if it exists
+        argv = list(argv)
+        if rcFile is not None:
+            for rcOpt in read_rcfile(rcFile):
+                argv.insert(0, rcOpt)
+
+        # manual argument parsing easier than getopts IMO. most options just
+        # set an attribute, see FLAG_OPTIONS and VALUE_OPTIONS
+        for arg in argv:
+            if arg in ("-h", "--help"):
+                doUsage(self)
+                sys.exit(0)
+            elif arg in FLAG_OPTIONS:
+                attribute, value = FLAG_OPTIONS[arg]
+                setattr(self, attribute, value)
+                continue
+
+            option, _, value = arg.partition("=")
+            if option in VALUE_OPTIONS:
+                attribute, convert = VALUE_OPTIONS[option]
+                try:
+                    setattr(self, attribute, convert(value))
+                except ValueError as e:
+                    self.usage_error(f"{arg}: {e}")
+            elif option == "--listen":
+                self.listen.append(value)
+            elif option == "--pattern":
+                name, equals, regexp = value.partition("=")
+                if not (name and equals and regexp):
+                    self.usage_error(f"{arg}: must be NAME=RE")
+                self.patterns.append((name, regexp))
+            elif option == "--merge":
+                self.mergeStates = True
+                self.files.append(os.path.expanduser(value))
+            elif option in ("-p", "--palette"):
+                self.colourPalette = value
+                self.colourisedOutput = True
+
+        # first, size, which might be further overridden by width/height later
+        if self.size in ("full", "fl", "f"):
+            import shutil
+
+            # tput will tell us the term width/height even if input is stdin
+            self.width, self.height = shutil.get_terminal_size()
+            # convert to numerics from string
+            self.width = int(self.width)
+            self.height = int(self.height) - 3
+            # need room for the verbosity output
+            if self.verbose:
+                self.height -= 4
+            # in case tput went all bad, ensure some minimum size
+            self.width = max(self.width, 40)
+            self.height = max(self.height, 10)
+        elif self.size in ("small", "sm", "s"):
+            self.width = 60
+            self.height = 10
+        elif self.size in ("medium", "med", "m"):
+            self.width = 100
+            self.height = 20
+        elif self.size in ("large", "lg", "l"):
+            self.width = 140
+            self.height = 35
+
+        # synonyms "monotonically-increasing": derivative, difference, delta, increasing
+        # so all "d" "i" and "m" words will be graphing those differences
+        if self.numOnly[0] in ("d", "i", "m"):
+            self.numOnly = "mon"
+        # synonyms "actual values": absolute, actual, number, normal, noop,
+        # so all "a" and "n" words will graph straight up numbers
+        if self.numOnly[0] in ("a", "n"):
+            self.numOnly = "abs"
+
+        # --bins is log, hdr or the width of fixed-width buckets
+        if self.bins not in ("", "log", "hdr"):
+            try:
+                self.binWidth = float(self.bins)
+            except ValueError:
+                self.binWidth = 0.0
+            if not self.binWidth > 0 or math.isinf(self.binWidth):
+                self.usage_error(f"--bins={self.bins}: must be hdr, log or a width above 0")
+            self.bins = "fixed"
+
+        # a line sampled at a rate of P stands for 1/P lines, a whole number
+        # of them if possible so counts stay whole. a rate of 1 samples all
+        if self.sampleRate is not None and not 0 < self.sampleRate <= 1:
+            self.usage_error(f"--sample={self.sampleRate}: must be above 0 and at most 1")
+        if self.reservoirSize is not None and self.reservoirSize < 1:
+            self.usage_error(f"--reservoir={self.reservoirSize}: must be at least 1 line")
+        # only lines that get tokenized are sampled, and only one way
+        sampling = "--sample" if self.sampleRate is not None else "--reservoir"
+        if self.sampleRate is not None and self.reservoirSize is not None:
+            self.usage_error("--sample: can't be used with --reservoir, pick one")
+        if self.sampleRate is not None or self.reservoirSize is not None:
+            for option, given in (
+                ("--graph", self.graphValues),
+                ("--merge", self.mergeStates),
+                ("--numonly", self.numOnly != "XXX"),
+                ("--bins", self.bins),
+            ):
+                if given:
+                    self.usage_error(f"{sampling}: can't be used with {option}")
+        if self.sampleRate is None or self.sampleRate == 1:
+            self.sampleRate = 0.0
+        if self.reservoirSize is None:
+            self.reservoirSize = 0
+        if self.sampleRate:
+            self.sampleScale = 1 / self.sampleRate
+            if self.sampleScale.is_integer():
+                self.sampleScale = int(self.sampleScale)
+            self.countScale = self.sampleScale
+
+        # sockets are followed as they're written to, like tail -f
+        if self.listen:
+            self.follow = True
+        # following the input redraws once a second unless told otherwise
+        if self.follow and not self.refresh:
+            self.refresh = 1.0
+
+        # all "s" words (spacesaving, ss, stream) pick the heavy-hitter counter
+        if self.counter[:1] == "s":
+            self.counter = "spacesaving"
+        elif self.counter[:1] == "c":
+            self.counter = "compact"
+        else:
+            self.counter = "prune"
+        # the window keeps exact per-bucket counts of its own, dropping the
+        # oldest bucket as it slides, so no other engine or decay fits it
+        if self.window and self.counter != "prune":
+            self.usage_error(f"--counter={self.counter}: can't be used with --window")
+        if self.window and self.decay:
+            self.usage_error("--decay: can't be used with --window, pick one")
+
+        # override variables if they were explicitly given
+        if self.widthArg != 0:
+            self.width = self.widthArg
+        if self.heightArg != 0:
+            self.height = self.heightArg
+
+        # maxKeys should be at least a few thousand greater than height to reduce odds
+        # of throwing away high-count values that appear sparingly in the data
+        if self.maxKeys < self.height + 3000:
+            self.maxKeys = self.height + 3000
+            if self.verbose and self.commandLine:
+                sys.stderr.write(f"Updated maxKeys to {self.maxKeys} (height + 3000)\n")
+
+        # colour palette
+        if self.colourisedOutput:
+            cl = self.colourPalette.split(",")
+            # ANSI color code is ESC+[+NN+m where ESC=chr(27), [ and m are
+            # the literal characters, and NN is a two-digit number, typically
+            # from 31 to 37 - why is this knowledge still useful in 2014?
+            cl = [chr(27) + "[" + e + "m" for e in cl]
+            (
+                self.regularColour,
+                self.keyColour,
+                self.ctColour,
+                self.pctColour,
+                self.graphColour,
+            ) = cl
+
+        # some useful ASCII-->utf-8 substitutions
+        if self.histogramChar == "ba":
+            self.unicodeMode = True
+            self.histogramChar = "▬"
+        elif self.histogramChar == "bl":
+            self.unicodeMode = True
+            self.histogramChar = "Ξ"
+        elif self.histogramChar == "em":
+            self.unicodeMode = True
+            self.histogramChar = "—"
+        elif self.histogramChar == "me":
+            self.unicodeMode = True
+            self.histogramChar = "⋯"
+        elif self.histogramChar == "di":
+            self.unicodeMode = True
+            self.histogramChar = "♦"
+        elif self.histogramChar == "dt":
+            self.unicodeMode = True
+            self.histogramChar = "•"
+        elif self.histogramChar == "sq":
+            self.unicodeMode = True
+            self.histogramChar = "□"
+
+        # sub-full character width graphing systems
+        if self.histogramChar == "pb":
+            self.charWidth = 0.125
+            self.graphChars = self.partialBlocks
+        elif self.histogramChar == "pl":
+            self.charWidth = 0.3334
+            self.graphChars = self.partialLines
+
+        # detect whether the user has passed a multibyte unicode character directly as the histogram char
+        if ord(self.histogramChar[0]) >= 128:
+            self.unicodeMode = True
+
+    def usage_error(self, message):
+        # a bad option ends the command line with a message, but is only a
+        # ValueError to code that gave the options itself
+        if self.commandLine:
+            sys.exit(message)
+        raise ValueError(message)
+
+
+class TokenCounter:
+    """
+    The counting engine, for use from Python rather than the command line -
+    say, in a long-running log shipper. Takes the command line's options, as
+    option strings or keyword arguments, but never looks at sys.argv or the
+    rc file and never writes anything itself - options only the command line
+    has, like --help or --save-state, are a ValueError, as are bad ones. Each
+    counter keeps its own settings, so a process can keep as many as it likes:
+
+        counter = TokenCounter("-t=word", counter="spacesaving", keys=10000)
+        counter.update_lines(chunk)
+        counter.top(10)
+        print(counter.render(width=100, height=20), end="")
+    """
+
+    # options that read or write anything besides what the counter is given
+    # (-h=N is the height, but -h on its own is --help)
+    CLI_OPTIONS = (
+        "--help",
+        "--rcfile",
+        "--file",
+        "--follow",
+        "--refresh",
+        "--listen",
+        "--merge",
+        "--save-state",
+        "--profile",
+    )
+
+    def __init__(self, *options, **kwargs):
+        # keyword arguments are options with _ for -, True for a flag
+        for name, value in kwargs.items():
+            option = "--" + name.replace("_", "-")
+            options += (option if value is True else f"{option}={value}",)
+        for option in options:
+            if not option.startswith("-"):
+                raise ValueError(f"{option}: files are only read by the command line")
+            if option == "-h" or option.partition("=")[0] in self.CLI_OPTIONS:
+                raise ValueError(f"{option} is only for the command line")
+        self.s = Settings(options)
+        self.reader = InputReader(self.s)
+        if self.s.weightField is not None:
+            self.tokenizer = WeightTokenizer(self.s)
+        else:
+            self.tokenizer = Tokenizer(self.s)
+        self.histogram = Histogram()
+
+    def update(self, tokens):
+        # count tokens already split out of their input, or add in a dict
+        # of token: count (or weight), as with collections.Counter. either
+        # way the tokens still have to pass --match
+        tokenizer = self.tokenizer
+        if hasattr(tokens, "items"):
+            tokenDict = dict(tokens)
+            totalObjects = sum(tokenDict.values())
+        else:
+            tokenDict = Counter(tokens)
+            totalObjects = sum(tokenDict.values())
+        if tokenizer.emptyToken == b"":
+            # whole lines are counted as bytes, so tokens have to be too
+            tokenDict = self.own_keys(tokenDict)
+        tokenDict = tokenizer.match_tokens(tokenDict)
+        self.merge_tally((tokenDict, totalObjects, sum(tokenDict.values())))
+
+    def update_lines(self, chunk):
+        # tokenize and count a chunk of input, bytes of whole lines - the
+        # same chunks the command line reads
+        self.merge_tally(self.tokenizer.tally(chunk))
+
+    def merge_tally(self, tally):
+        self.reader.tick(self.s)
+        self.reader.merge_tally(self.s, tally)
+
+    def top(self, n):
+        # the n highest (key, count) pairs, highest first
+        s = self.s
+        self.reader.tick(s)
+        tokenDict = self.reader.tokenDict
+        countScale = s.countScale
+        result = []
+        for k in top_keys(tokenDict, n + 1):
+            if k and len(result) < n:
+                key = k
+                if isinstance(k, bytes):
+                    key = k.decode(s.encoding, "backslashreplace")
+                result.append((key, tokenDict[k] * countScale))
+        return result
+
+    def merge(self, other):
+        # add another counter's counts to ours, as --merge does with states
+        s = self.s
+        otherScale = other.s.countScale
+        tokenDict = other.reader.tokenDict
+        errorDict = other.reader.errorDict
+        if (self.tokenizer.emptyToken == b"") != (other.tokenizer.emptyToken == b""):
+            # one counts whole lines as bytes, the other tokens as text, and
+            # their sketches hashed the keys as such
+            s.distinct = None
+            tokenDict = self.own_keys(tokenDict)
+            if errorDict is not None:
+                errorDict = self.own_keys(errorDict)
+        if otherScale != 1:
+            tokenDict = {k: v * otherScale for k, v in tokenDict.items()}
+            if errorDict is not None:
+                errorDict = {k: e * otherScale for k, e in errorDict.items()}
+        weDropped = self.reader.keys_dropped(s)
+        s.totalObjects += other.s.totalObjects
+        s.numPrunes += other.s.numPrunes
+        self.reader.tick(s)
+        self.reader.merge_counts(
+            s,
+            tokenDict,
+            errorDict,
+            other.s.totalValues * otherScale,
+            other.reader.keys_dropped(other.s),
+            weDropped,
+        )
+        if s.distinct is not None and other.s.distinct is not None:
+            s.distinct.merge(other.s.distinct)
+
+    def own_keys(self, counts):
+        # counts keyed the way this counter keys them, bytes or text, using
+        # surrogateescape so undecodable bytes survive the round trip
+        encoding = self.tokenizer.encoding
+        if self.tokenizer.emptyToken == b"":
+            return {
+                k.encode(encoding, "surrogateescape") if isinstance(k, str) else k: v
+                for k, v in counts.items()
+            }
+        return {
+            k.decode(encoding, "surrogateescape") if isinstance(k, bytes) else k: v
+            for k, v in counts.items()
+        }
+
+    def render(self, width=None, height=None):
+        # the histogram as text, with the header (and, with verbose, the
+        # stats) the command line writes to stderr in front of it
+        s = self.s
+        self.reader.tick(s)
+        size = s.width, s.height
+        if width is not None:
+            s.width = width
+        if height is not None:
+            s.height = height
+        frame = io.StringIO()
+        try:
+            self.histogram.write_hist(
+                s, self.reader.tokenDict, self.reader.errorDict, None, frame, frame
+            )
+        finally:
+            s.width, s.height = size
+        return frame.getvalue()
+
+
+def doUsage(s):
+    print(
+        f"""
+usage: <commandWithOutput> | {scriptName}
+         [--rcfile=<rcFile>]
+         [--size={{sm|med|lg|full}} | --width=<width> --height=<height>]
+         [--color] [--palette=r,k,c,p,g]
+         [--tokenize=<tokenChar>]
+         [--graph[=[kv|vk]] [--numonly[=derivative,diff|abs,absolute,actual]]
+         [--max=<value> | --rolling-max=N] [--bins[=hdr|log|<width>]]
+         [--char=<barChars>|<substitutionString>]
+         [--counter=prune|spacesaving|compact] [--max-key-len=N] [--memory=<size>]
+         [--jobs=N] [--file=<path>]
+         [--fields=<fields> [--delimiter=<delimiter>]]
+         [--pattern=<name>=<regexp>...]
+         [--key-field=<field> --weight-field=<field> [--delimiter=<delimiter>]]
+         [--follow] [--refresh=<seconds>] [--listen=<address>...] [--tag-source]
+         [--sample=<probability> | --reservoir=<lines>]
+         [--window=<duration> [--window-buckets=N] | --decay=<duration>]
+         [--save-state=<file>] [--merge <stateFile>...]
+         [--profile[=text|json|cprofile]]
+         [--help] [--verbose] [<file>...]
+  <file>...      read these files rather than stdin, decompressing any that are gzip,
+                 bzip2, xz or zstd compressed (several at once, in threads)
+  --keys=K       every {s.keyPruneInterval} values added, prune hash to K keys (default 5000)
+  --counter=E    counting engine used to keep memory bounded:
+        prune    exact counts, pruned to --keys keys every {s.keyPruneInterval} values (default)
+        ss       Space-Saving: never more than --keys keys, each count shown with
+                 the most it may be overcounted by (±Err)
+        compact  exact counts like prune, but kept by 64-bit key hash in a compact
+                 table, naming only the keys near the top: --keys can be far higher
+                 for the same memory. -v shows bytes per key
+  --decay=D      counts halve every D (eg 90s, 5m, 1h) so recent input dominates
+                 (not with --window)
+  --delimiter=D  split --fields, --key-field and --weight-field on D rather than
+                 on runs of whitespace
+  --bins[=B]     input is numerics, graph how many fall in each bucket of values:
+        hdr      powers of two, each split into 32 finer buckets (default)
+        log      powers of two
+        W        buckets W wide, eg --bins=10 for 0..10, 10..20 and so on
+  --char=C       character(s) to use for histogram character, some substitutions follow:
+        pl       Use 1/3-width unicode partial lines to simulate 3x actual terminal width
+        pb       Use 1/8-width unicode partial blocks to simulate 8x actual terminal width
+        ba       (▬) Bar
+        bl       (Ξ) Building
+        em       (—) Emdash
+        me       (⋯) Mid-Elipses
+        di       (♦) Diamond
+        dt       (•) Dot
+        sq       (□) Square
+  --color        colourise the output
+  --fields=F     count fields of each line (numbered from 1, like awk) instead of
+                 whole lines, with a histogram per field, eg --fields=5,7. join
+                 fields with + to count them together as one key, eg 5,7+9
+  --file=F       read input from file F (memory-mapped) instead of stdin
+  --follow       redraw the histogram in place as input arrives, eg from tail -f.
+                 files given are followed too, like tail -F, until ^C
+  --graph[=G]    input is already key/value pairs. vk is default:
+        kv       input is ordered key then value
+        vk       input is ordered value then key
+  --height=N     height of histogram, headers non-inclusive, overrides --size
+  --help         get help
+  --jobs=N       tokenize stdin with N worker processes (0 = one per cpu)
+  --key-field=F  with --weight-field, the field the weights are summed by (default 1),
+                 or fields joined with +, eg 7+9
+  --listen=A     read what is written to a socket at A (and any files given), A being
+                 [host:]port or unix:path - give it again for more. implies --follow
+  --logarithmic  logarithmic graph
+  --max=V        --numonly bars are scaled to V, so rows print as input arrives
+  --max-key-len=N  cut tokens (or lines) down to their first N characters, so that
+                 long ones with the same start count as one key
+  --memory=M     instead of --keys, prune the lowest counts (a step at a time) to keep
+                 them to about M bytes of memory, eg 64K, 512M or 2G - but never to
+                 fewer keys than the histogram has rows
+  --merge F...   instead of reading input, combine counter states saved with --save-state
+  --match=RE     only match lines (or tokens) that match this regexp, some substitutions follow:
+        word     ^[A-Z,a-z]+\\$ - tokens/lines must be entirely alphabetic
+        num      ^\\d+\\$        - tokens/lines must be entirely numeric
+  --numonly[=N]  input is numerics, simply graph values without labels
+        actual   input is just values (default - abs, absolute are synonymous to actual)
+        diff     input monotonically-increasing, graph differences (of 2nd and later values)
+  --palette=P    comma-separated list of ANSI colour values for portions of the output
+                 in this order: regular, key, count, percent, graph. implies --color.
+  --pattern=N=RE  count the tokens (or lines) matching RE under the name N, with a
+                 histogram per name. give it again for more patterns, all matched
+                 in one pass - a token counts toward the first pattern it matches
+  --profile[=P]  report where the time went on stderr: per-phase wall/cpu times,
+                 bytes read, prunes and peak memory
+        text     a table (default)
+        json     one json object
+        cprofile the table, then the 30 slowest functions by cumulative time
+  --rcfile=F     use this rcfile instead of ~/.distributionrc - must be first argument!
+  --refresh=S    redraw the histogram in place every S seconds (implies --follow)
+  --reservoir=N  count a uniform random sample of N lines of the input, scaling
+                 counts back up (once the input ends, so not with --follow)
+  --rolling-max=N  --numonly bars are scaled to the max of the last N values, so
+                 rows print as input arrives
+  --sample=P     count each line with probability P (eg 0.01), scaling counts back
+                 up by 1/P. -v shows a 95% confidence interval of each count as ±Err
+                 (like --reservoir, only for tokens or lines: not with --graph,
+                 --merge, --numonly or --bins)
+  --save-state=F save the counts to F in a compact binary form, for --merge later
+  --size=S       size of histogram, can abbreviate to single character, overridden by --width/--height
+        small    40x10
+        medium   80x20
+        large    120x30
+        full     terminal width x terminal height (approximately)
+  --tag-source   with --listen or --follow files, put the name of the socket or file
+                 each key came from in front of it
+  --tokenize=RE  split input on regexp RE and make histogram of all resulting tokens
+        word     [^\\w] - split on non-word characters like colons, brackets, commas, etc
+        white    \\s    - split on whitespace
+  --weight-field=F  instead of counting lines, sum this field's numbers for each key,
+                 eg the bytes of an access log by path: --key-field=7 --weight-field=10
+  --width=N      width of the histogram report, N characters, overrides --size
+  --window=D     only count input that arrived in the last D (eg 90s, 5m, 1h),
+                 exactly: not with --counter=ss|compact or --decay
+  --window-buckets=N  sub-windows the window slides by (default 10)
+  --verbose      be verbose
+
+You can use single-characters options, like so: -h=25 -w=20 -v. You must still include the =
+
+Samples:
+  du -sb /etc/* | {scriptName} --palette=0,37,34,33,32 --graph
+  du -sk /etc/* | awk '{{print $2\" \"$1}}' | {scriptName} --graph=kv
+  zcat /var/log/syslog*gz | {scriptName} -t=word --save-state=$(hostname).state
+  {scriptName} -t=word /var/log/syslog*gz
+  {scriptName} --merge *.state
+  {scriptName} -t=white --follow --tag-source /var/log/app/*.log --listen=unix:/tmp/dist.sock
+  zcat /var/log/syslog*gz | {scriptName} -t=white --pattern=ids=num --pattern=hosts='[\\w-]+\\.[\\w.-]+$'
+  {scriptName} --key-field=7 --weight-field=10 /var/log/nginx/access.log
+  zcat /var/log/syslog*gz | {scriptName} --char=o --tokenize=white
+  zcat /var/log/syslog*gz | awk '{{print $5}}'  | {scriptName} -t=word -m-word -h=15 -c=/
+  zcat /var/log/syslog*gz | cut -c 1-9        | {scriptName} -width=60 -height=10 -char=em
+  find /etc -type f       | cut -c 6-         | {scriptName} -tokenize=/ -w=90 -h=35 -c=dt
+  cat /usr/share/dict/words | awk '{{print length($1)}}' | {scriptName} -c=* -w=50 -h=10 | sort -n
+"""
+    )
+
+
+# simple argument parsing and call top-level routines
+def main():
+    # instantiate our classes
+    s = Settings()
+    if s.mergeStates and not s.window and s.counter != "spacesaving":
+        # states saved by Space-Saving get merged by it, keeping their error
+        # bounds
+        try:
+            if any(state_has_errors(path) for path in s.files):
+                s.counter = "spacesaving"
+        except OSError as e:
+            sys.exit(f"{e.filename}: {e.strerror}")
+    i = InputReader(s)
+    h = Histogram()
+
+    if s.profile:
+        # --profile: time each phase of the work, reporting when we exit
+        import atexit
+
+        s.profiler = Profiler(s)
+        s.profiler.instrument(i.counter, "merge", "merge")
+        s.profiler.instrument(i.counter, "prune_keys", "prune")
+        s.profiler.instrument(i.counter, "trim", "prune")
+        if s.distinct is not None:
+            s.profiler.instrument(s.distinct, "update", "distinct")
+        for method in ("write_hist", "redraw", "write_numerics", "write_bins"):
+            s.profiler.instrument(h, method, "render")
+        atexit.register(s.profiler.report, s)
+
+    if s.mergeStates:
+        # combining states saved by earlier runs. a missing, corrupt or
+        # unmergeable state ends it with a message, not a traceback
+        try:
+            i.read_states(s)
+        except OSError as e:
+            sys.exit(f"{e.filename}: {e.strerror}")
+        except ValueError as e:
+            sys.exit(str(e))
+    elif s.graphValues:
+        # user passed g=vk or g=kv
+        i.read_pretallied_tokens(s)
+    elif s.fields or s.patterns:
+        # a histogram for each field or pattern, all counted in one pass
+        if s.fields:
+            i.read_fields(s)
+            labels = [
+                "Field " + "+".join(str(field + 1) for field in group)
+                for group in s.fields
+            ]
+        else:
+            i.read_patterns(s)
+            labels = [f"Pattern {name}" for name, regexp in s.patterns]
+        for n, (sectionSettings, reader) in enumerate(i.sectionReaders):
+            sys.stdout.flush()
+            sys.stderr.write(f"{chr(10) if n else ''}{labels[n]}:\n")
+            h.write_hist(sectionSettings, reader.tokenDict, reader.errorDict)
+        sys.exit(0)
+    elif s.bins:
+        # numeric input counted into buckets, which has its own output
+        i.read_bins(s)
+        h.write_bins(s, i.bins)
+        sys.exit(0)
+    elif s.numOnly != "XXX":
+        # s.numOnly was specified by the user
+        i.read_numerics(s, h)
+        # read_numerics will have output a graph already, so exit
+        sys.exit(0)
+    else:
+        # this is the original behaviour of distribution
+        i.tokenize_input(s, h)
+
+    if s.saveState:
+        save_state(s, s.saveState, i.tokenDict, i.errorDict, i.keys_dropped(s))
+
+    if s.refresh:
+        # the final frame goes where the live ones did. liveTop is only kept
+        # when tokenizing, otherwise let write_hist find the top keys
+        h.redraw(s, i.tokenDict, i.errorDict, i.liveTop or None)
+    else:
+        h.write_hist(s, i.tokenDict, i.errorDict)
+
+
+# what is this magic?
+scriptName = os.path.basename(sys.argv[0])
@@ -0,0 +1,622 @@
+#! /usr/bin/env python3
+
+"""
+Throughput benchmarks for distribution.py
+
+Like runTests.sh, run this from the tests directory. It benchmarks
+../distribution.py unless the distribution environment variable points
+somewhere else:
+
+    ./bench.py                      run every benchmark
+    ./bench.py presets startup      run only the named benchmarks
+    ./bench.py --json=new.json      also write the results out as json
+    ./bench.py --compare=old.json   fail if anything got slower (or bigger)
+                                    than old.json by more than --threshold
+
+Every benchmark returns {case: {metric: value}}. Metrics ending in
+_per_sec are better higher, the rest (_ms, _kb) are better lower.
+"""
+
+import importlib.machinery
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+def load_distribution():
+    # the script has no importable name (and may not even end in .py), so
+    # load it straight from its path
+    path = os.environ.get("distribution", "../distribution.py")
+    loader = importlib.machinery.SourceFileLoader("distribution", path)
+    spec = importlib.util.spec_from_loader("distribution", loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def settings(d, *args):
+    # a Settings built from the given options only, ignoring ~/.distributionrc
+    sys.argv = ["distribution", "--rcfile=/dev/null", *args]
+    return d.Settings()
+
+
+def chunked(data, chunkSize=4 * 1024 * 1024):
+    # cut bytes into line-aligned chunks like read_chunks gives
+    chunks = []
+    while data:
+        cut = data.rfind(b"\n", 0, chunkSize) + 1 or len(data)
+        chunks.append(data[:cut])
+        data = data[cut:]
+    return chunks
+
+
+def syslog_chunks(numLines, chunkSize=4 * 1024 * 1024):
+    # syslog-looking lines with zipf-ish word frequencies, some numbers and
+    # punctuation
+    rng = random.Random(42)
+    words = [
+        "".join(rng.choice("abcdefghijklmnop") for _ in range(rng.randint(2, 9)))
+        for _ in range(20000)
+    ]
+    lines = []
+    for i in range(numLines):
+        picked = " ".join(
+            words[min(int(rng.paretovariate(0.8)), len(words)) - 1] for _ in range(6)
+        )
+        lines.append(f"Jan {i % 28 + 1:2d} host[{i % 977}]: {picked}, code={i % 503}\n")
+    return chunked("".join(lines).encode(), chunkSize)
+
+
+# input generators for the suite: each returns numLines lines of bytes
+def zipf_lines(numLines):
+    # keys with zipfian frequencies, the case distribution is built for
+    rng = random.Random(42)
+    return b"".join(b"key%d\n" % int(rng.paretovariate(0.6)) for _ in range(numLines))
+
+
+def uuid_lines(numLines):
+    # nearly every key distinct, so the counters prune (or evict) constantly
+    rng = random.Random(42)
+    return b"".join(
+        b"%s\n" % str(uuid.UUID(int=rng.getrandbits(128), version=4)).encode()
+        for _ in range(numLines)
+    )
+
+
+def du_lines(numLines, order="vk"):
+    # pre-tallied input like du -sb gives, value then key (or key then value)
+    rng = random.Random(42)
+    lines = []
+    for i in range(numLines):
+        size = int(rng.paretovariate(0.7) * 1024)
+        path = f"/srv/data/{i % 5000}/file{int(rng.paretovariate(0.9))}"
+        lines.append(f"{size}\t{path}\n" if order == "vk" else f"{path} {size}\n")
+    return "".join(lines).encode()
+
+
+def numeric_lines(numLines):
+    # a noisy latency-like series, for --numonly and --bins
+    rng = random.Random(42)
+    return b"".join(b"%.1f\n" % rng.lognormvariate(3, 1) for _ in range(numLines))
+
+
+def sentence_lines(numLines):
+    # whole syslog-ish lines, for tokenizing
+    return b"".join(syslog_chunks(numLines))
+
+
+# input, then options, for each case of the suite
+SUITE_CASES = [
+    ("zipf lines", "zipf", []),
+    ("zipf counter=ss", "zipf", ["--counter=ss"]),
+    ("zipf jobs=2", "zipf", ["--jobs=2"]),
+    ("uuid lines", "uuid", []),
+    ("uuid counter=ss", "uuid", ["--counter=ss"]),
+    ("uuid verbose", "uuid", ["-v"]),
+    ("uuid counter=compact", "uuid", ["--counter=compact", "--keys=1000000"]),
+    ("uuid prune", "uuid-prune", []),
+    ("syslog tokenize=white", "syslog", ["-t=white"]),
+    ("syslog tokenize=word match=word", "syslog", ["-t=word", "-m=word"]),
+    ("syslog tokenize=regexp", "syslog", [r"-t=[\s:,]+"]),
+    ("du graph=vk", "du-vk", ["-g"]),
+    ("du graph=kv", "du-kv", ["-g=kv"]),
+    ("numeric numonly", "numeric", ["-n"]),
+    ("numeric numonly max=100", "numeric", ["-n", "--max=100"]),
+    ("numeric bins", "numeric", ["--bins"]),
+]
+
+SUITE_INPUTS = {
+    "zipf": zipf_lines,
+    "uuid": uuid_lines,
+    "uuid-prune": uuid_lines,
+    "syslog": sentence_lines,
+    "du-vk": du_lines,
+    "du-kv": lambda numLines: du_lines(numLines, "kv"),
+    "numeric": numeric_lines,
+}
+
+# inputs that need more lines than --lines may give them, to reach the code
+# they're there for: the counter only prunes every keyPruneInterval values
+SUITE_MIN_LINES = {
+    "uuid-prune": lambda d: 2 * settings(d).keyPruneInterval,
+}
+
+
+# runs a command with stdout and stderr thrown away, printing the peak RSS
+# it reached. a child's peak RSS starts out at whatever its parent's was
+# when it was forked, so it takes a small parent to measure a process
+# started from a big one (like this benchmark) accurately
+RSS_LAUNCHER = """
+import resource, subprocess, sys
+subprocess.run(sys.argv[1:], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+"""
+
+
+def run_once(command, inputPath):
+    # run command on the input file, timing how long until its first byte
+    # of output and until it exits
+    with open(inputPath, "rb") as stdin:
+        startTime = time.perf_counter()
+        proc = subprocess.Popen(
+            command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        proc.stdout.read(1)
+        firstOutput = time.perf_counter() - startTime
+        while proc.stdout.read(65536):
+            pass
+        proc.stdout.close()
+        if proc.wait():
+            raise RuntimeError(f"{' '.join(command)} exited {proc.returncode}")
+        elapsed = time.perf_counter() - startTime
+    return elapsed, firstOutput
+
+
+def peak_rss(command, inputPath):
+    # peak RSS of command run on the input file, in kilobytes (linux's
+    # ru_maxrss units)
+    with open(inputPath, "rb") as stdin:
+        return int(
+            subprocess.run(
+                [sys.executable, "-c", RSS_LAUNCHER, *command],
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                check=True,
+            ).stdout
+        )
+
+
+def bench_suite(d, numLines=1000000, repeat=3):
+    # the whole script, run on each kind of input with various options.
+    # the best of repeat runs counts, being the least disturbed by whatever
+    # else the machine is doing, plus one more run to measure memory in
+    path = os.environ.get("distribution", "../distribution.py")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpDir:
+        inputs = {}
+        inputLines = {}
+        for label, inputName, args in SUITE_CASES:
+            if inputName not in inputs:
+                minLines = SUITE_MIN_LINES.get(inputName)
+                inputLines[inputName] = numLines
+                if minLines is not None:
+                    inputLines[inputName] = max(numLines, minLines(d))
+                data = SUITE_INPUTS[inputName](inputLines[inputName])
+                inputs[inputName] = os.path.join(tmpDir, inputName)
+                with open(inputs[inputName], "wb") as f:
+                    f.write(data)
+            caseLines = inputLines[inputName]
+
+            # tokens the script will examine, counted here so the runs
+            # themselves needn't be verbose
+            with open(inputs[inputName], "rb") as f:
+                chunks = chunked(f.read())
+            numTokens = caseLines
+            if any(arg.startswith(("-t=", "--tokenize=")) for arg in args):
+                tokenizer = d.Tokenizer(settings(d, *args))
+                numTokens = sum(tokenizer.tally(chunk)[1] for chunk in chunks)
+
+            command = [sys.executable, path, "--rcfile=/dev/null", *args]
+            runs = [run_once(command, inputs[inputName]) for _ in range(repeat)]
+            elapsed = min(run[0] for run in runs)
+            firstOutput = min(run[1] for run in runs)
+            peakRss = peak_rss(command, inputs[inputName])
+            results[label] = {
+                "lines_per_sec": caseLines / elapsed,
+                "tokens_per_sec": numTokens / elapsed,
+                "first_output_ms": firstOutput * 1000,
+                "peak_rss_kb": peakRss,
+            }
+            print(
+                f"{label:<32} {caseLines / elapsed:>12,.0f} lines/sec "
+                f"{numTokens / elapsed:>12,.0f} tokens/sec "
+                f"{firstOutput * 1000:>8,.0f}ms to output {peakRss:>9,d}KB peak"
+            )
+    return results
+
+
+def bench_presets(d):
+    # built-in --tokenize/--match presets against the regexps they stand for
+    chunks = syslog_chunks(200000)
+    cases = [
+        ("tokenize=white", ["-t=white"], [r"-t=\s+"]),
+        ("tokenize=word", ["-t=word"], [r"-t=\W"]),
+        (
+            "tokenize=word match=word",
+            ["-t=word", "-m=word"],
+            [r"-t=\W", "-m=^[A-Z,a-z]+$"],
+        ),
+        ("tokenize=white match=num", ["-t=white", "-m=num"], [r"-t=\s+", r"-m=^\d+$"]),
+        ("lines match=num", ["-m=num"], [r"-m=^\d+$"]),
+    ]
+    results = {}
+    for label, presetArgs, regexArgs in cases:
+        for path, args in (("preset", presetArgs), ("regex", regexArgs)):
+            tokenizer = d.Tokenizer(settings(d, *args))
+            numTokens = 0
+            startTime = time.perf_counter()
+            for chunk in chunks:
+                numTokens += tokenizer.tally(chunk)[1]
+            elapsed = time.perf_counter() - startTime
+            results[f"{label} {path}"] = {"tokens_per_sec": numTokens / elapsed}
+            print(f"{label:<26} {path:<6} {numTokens / elapsed:>14,.0f} tokens/sec")
+    return results
+
+
+def bench_topn(d):
+    # selecting the histogram rows and the keys that survive a prune from
+    # 10M distinct keys, against the full sort write_hist used to do
+    rng = random.Random(42)
+    tokenDict = {b"key%d" % i: int(rng.paretovariate(1.0)) for i in range(10000000)}
+    cases = [
+        ("top_keys height=15", lambda: d.top_keys(tokenDict, 16)),
+        ("top_keys keys=5000", lambda: d.top_keys(tokenDict, 5002)),
+        (
+            "full sort",
+            lambda: sorted(
+                tokenDict, key=lambda k: (tokenDict.get(k), k), reverse=True
+            )[:16],
+        ),
+    ]
+    results = {}
+    for label, select in cases:
+        startTime = time.perf_counter()
+        select()
+        elapsed = time.perf_counter() - startTime
+        results[label] = {"elapsed_ms": elapsed * 1000}
+        print(f"{label:<26} {elapsed * 1000:>10,.0f}ms")
+    return results
+
+
+def bench_render(d):
+    # --numonly output of 1M rows, against writing each row piece by piece
+    s = settings(d, "--numonly", "--color", "-w=100")
+    h = d.Histogram()
+    rng = random.Random(42)
+    values = [rng.uniform(0, 100000) for _ in range(1000000)]
+    maxVal = max(values)
+    maxWidth = len(str(maxVal))
+    sumVal = sum(values)
+
+    def piecewise():
+        for k in values:
+            sys.stdout.write(s.keyColour)
+            sys.stdout.write(str(int(k)).rjust(maxWidth))
+            pct = f"({float(k) / float(sumVal) * 100:2.2f}%)"
+            sys.stdout.write(s.pctColour)
+            sys.stdout.write(pct.rjust(9) + " ")
+            sys.stdout.write(s.graphColour)
+            sys.stdout.write(
+                h.histogram_bar(s, s.width - 11 - maxWidth, maxVal, k) + "\n"
+            )
+            sys.stdout.write(s.regularColour)
+
+    cases = [
+        (
+            "write_numerics",
+            lambda: h.write_numerics(s, values, maxVal, maxWidth, sumVal),
+        ),
+        ("per-row writes", piecewise),
+    ]
+    results = {}
+    realStdout = sys.stdout
+    for label, render in cases:
+        with open(os.devnull, "w") as sys.stdout:
+            startTime = time.perf_counter()
+            render()
+            elapsed = time.perf_counter() - startTime
+        sys.stdout = realStdout
+        results[label] = {"rows_per_sec": len(values) / elapsed}
+        print(f"{label:<26} {len(values) / elapsed:>14,.0f} rows/sec")
+
+    # whole frames, as --refresh redraws them on a wide terminal
+    tokenDict = {f"key{i}": int(rng.paretovariate(1.0)) for i in range(100000)}
+    topKeys = d.top_keys(tokenDict, 101)
+    for label, args in [("frame", []), ("frame char=pb", ["--char=pb"])]:
+        s = settings(d, "--color", "-w=300", "-h=100", *args)
+        s.totalValues = sum(tokenDict.values())
+        frame = io.StringIO()
+        numFrames = 200
+        startTime = time.perf_counter()
+        for _ in range(numFrames):
+            h.write_hist(s, tokenDict, None, topKeys, frame, frame)
+            frame.seek(0)
+            frame.truncate()
+        elapsed = time.perf_counter() - startTime
+        results[label] = {"frames_per_sec": numFrames / elapsed}
+        print(f"{label:<26} {numFrames / elapsed:>14,.0f} frames/sec")
+    return results
+
+
+def bench_files(d, numFiles=4, numLines=500000, repeat=3):
+    # gzipped log files read straight from the command line, against the
+    # zcat | distribution it saves
+    import gzip
+
+    path = os.environ.get("distribution", "../distribution.py")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpDir:
+        files = []
+        for n in range(numFiles):
+            files.append(os.path.join(tmpDir, f"syslog.{n}.gz"))
+            with gzip.open(files[-1], "wb", compresslevel=6) as f:
+                f.write(sentence_lines(numLines))
+        command = [sys.executable, path, "--rcfile=/dev/null", "-t=word"]
+        shellPipe = ["sh", "-c", f"zcat {shlex.join(files)} | {shlex.join(command)}"]
+        cases = [
+            ("file arguments", command + files),
+            ("zcat |", shellPipe),
+        ]
+        for label, args in cases:
+            elapsed = math.inf
+            for _ in range(repeat):
+                startTime = time.perf_counter()
+                subprocess.run(
+                    args,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    check=True,
+                )
+                elapsed = min(elapsed, time.perf_counter() - startTime)
+            linesPerSec = numFiles * numLines / elapsed
+            results[label] = {"lines_per_sec": linesPerSec}
+            print(f"{label:<26} {linesPerSec:>14,.0f} lines/sec")
+    return results
+
+
+def top_rows(stdout, height):
+    # {key: count} of a histogram's rows, which are key|count (pct) bar
+    rows = {}
+    for line in stdout.decode().splitlines()[1 : height + 1]:
+        key, rest = line.rsplit("|", 1)
+        rows[key] = float(rest.split()[0])
+    return rows
+
+
+def bench_sample(d, numLines=2000000, repeat=3):
+    # --sample and --reservoir on zipfian keys, against counting every line:
+    # how much faster each is, how many of the exact top 10 it misses and how
+    # far off its counts of those it finds are
+    path = os.environ.get("distribution", "../distribution.py")
+    command = [sys.executable, path, "--rcfile=/dev/null", "--height=10"]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpDir:
+        inputPath = os.path.join(tmpDir, "zipf")
+        with open(inputPath, "wb") as f:
+            f.write(zipf_lines(numLines))
+        cases = [
+            ("exact", []),
+            ("sample=0.1", ["--sample=0.1"]),
+            ("sample=0.01", ["--sample=0.01"]),
+            ("sample=0.001", ["--sample=0.001"]),
+            ("reservoir=100000", ["--reservoir=100000"]),
+        ]
+        exact = None
+        for label, args in cases:
+            elapsed = math.inf
+            for _ in range(repeat):
+                with open(inputPath, "rb") as stdin:
+                    startTime = time.perf_counter()
+                    stdout = subprocess.run(
+                        command + args,
+                        stdin=stdin,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.DEVNULL,
+                        check=True,
+                    ).stdout
+                    elapsed = min(elapsed, time.perf_counter() - startTime)
+            rows = top_rows(stdout, 10)
+            exact = exact or rows
+            found = [k for k in exact if k in rows]
+            error = sum(abs(rows[k] - exact[k]) / exact[k] for k in found)
+            results[label] = {
+                "lines_per_sec": numLines / elapsed,
+                "top10_missed": len(exact) - len(found),
+                "error_pct": error / max(len(found), 1) * 100,
+            }
+            print(
+                f"{label:<26} {numLines / elapsed:>14,.0f} lines/sec"
+                f" {len(exact) - len(found):>3} of top 10 missed"
+                f" {error / max(len(found), 1) * 100:>7.2f}% mean error"
+            )
+    return results
+
+
+# the script may take at most this many times as long to start up as python
+# doing nothing, which is most of it, or the startup benchmark fails
+STARTUP_MAX_RATIO = 3
+
+# the script's module gets cached compiled, as it would be once installed,
+# even where the environment says not to
+STARTUP_ENV = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+
+
+def import_time(command, repeat=5):
+    # milliseconds python -X importtime says went on importing modules at
+    # the top level (the nested ones being included in those), best of
+    # repeat runs
+    best = math.inf
+    for _ in range(repeat):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", *command],
+            input=b"1 a\n",
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            env=STARTUP_ENV,
+        ).stderr.decode()
+        total = 0
+        for line in stderr.splitlines():
+            # import time: <self us> | <cumulative us> | <indented module>
+            fields = line.split("|")
+            if len(fields) == 3 and fields[1].strip().isdigit():
+                if not fields[2].startswith("  "):
+                    total += int(fields[1])
+        best = min(best, total / 1000)
+    return best
+
+
+def bench_startup(d, repeat=20):
+    # how long the script takes on a single line of input, which is all
+    # startup: the interpreter, loading distributionlib, imports and parsing
+    # options. imports_ms only counts what the script imports on top of
+    # what the interpreter itself does
+    path = os.environ.get("distribution", "../distribution.py")
+    results = {}
+    baseImports = import_time(["-c", "pass"])
+    cases = [
+        ("python -c pass", ["-c", "pass"]),
+        ("lines", [path, "--rcfile=/dev/null"]),
+        ("tokenize=word", [path, "--rcfile=/dev/null", "-t=word"]),
+        ("tokenize=regexp", [path, "--rcfile=/dev/null", r"-t=[\s:,]+"]),
+        ("graph", [path, "--rcfile=/dev/null", "-g"]),
+        ("rcfile", [path, "--rcfile=../distributionrc"]),
+    ]
+    for label, command in cases:
+        elapsed = math.inf
+        for _ in range(repeat):
+            startTime = time.perf_counter()
+            subprocess.run(
+                [sys.executable, *command],
+                input=b"1 a\n",
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=STARTUP_ENV,
+            )
+            elapsed = min(elapsed, time.perf_counter() - startTime)
+        imports = import_time(command) - baseImports
+        results[label] = {"wall_ms": elapsed * 1000, "imports_ms": imports}
+        print(f"{label:<26} {elapsed * 1000:>8,.1f}ms {imports:>8,.1f}ms imports")
+
+    # what a run costs without distributionlib cached compiled, the first
+    # one after it changes, say
+    libPath = os.path.join(os.path.dirname(path), "distributionlib.py")
+    with open(libPath) as f:
+        source = f.read()
+    startTime = time.perf_counter()
+    compile(source, libPath, "exec")
+    elapsed = time.perf_counter() - startTime
+    results["compile"] = {"compile_ms": elapsed * 1000}
+    print(f"{'compile':<26} {elapsed * 1000:>8,.1f}ms")
+    return results
+
+
+def startup_regressions(results):
+    # startup needs no baseline to compare against, see STARTUP_MAX_RATIO
+    found = []
+    bare = results["python -c pass"]["wall_ms"]
+    for case, metrics in results.items():
+        if metrics.get("wall_ms", 0) > bare * STARTUP_MAX_RATIO:
+            found.append(
+                f"startup: {case}: wall_ms {metrics['wall_ms']:,.1f} is over "
+                f"{STARTUP_MAX_RATIO}x python -c pass ({bare:,.1f})"
+            )
+    return found
+
+
+BENCHMARKS = {
+    "presets": bench_presets,
+    "topn": bench_topn,
+    "render": bench_render,
+    "suite": bench_suite,
+    "startup": bench_startup,
+    "files": bench_files,
+    "sample": bench_sample,
+}
+
+
+def regressions(baseline, results, threshold):
+    # every metric that got worse than baseline by more than threshold
+    found = []
+    for name, cases in results.items():
+        for case, metrics in cases.items():
+            for metric, value in metrics.items():
+                try:
+                    old = baseline[name][case][metric]
+                except KeyError:
+                    continue
+                if metric.endswith("_per_sec"):
+                    worse = value < old * (1 - threshold)
+                else:
+                    worse = value > old * (1 + threshold)
+                if worse:
+                    found.append(f"{name}: {case}: {metric} {old:,.1f} -> {value:,.1f}")
+    return found
+
+
+def main():
+    names = []
+    jsonPath = ""
+    comparePath = ""
+    threshold = 0.15
+    numLines = 1000000
+    repeat = 3
+    for arg in sys.argv[1:]:
+        argList = arg.split("=", 1)
+        if argList[0] == "--json":
+            jsonPath = argList[1]
+        elif argList[0] == "--compare":
+            comparePath = argList[1]
+        elif argList[0] == "--threshold":
+            threshold = float(argList[1])
+        elif argList[0] == "--lines":
+            numLines = int(argList[1])
+        elif argList[0] == "--repeat":
+            repeat = int(argList[1])
+        else:
+            names.append(arg)
+
+    d = load_distribution()
+    results = {}
+    for name in names or list(BENCHMARKS):
+        print(f"== {name}")
+        if name == "suite":
+            results[name] = bench_suite(d, numLines, repeat)
+        else:
+            results[name] = BENCHMARKS[name](d)
+
+    if jsonPath:
+        with open(jsonPath, "w") as f:
+            json.dump(results, f, indent=2)
+    found = []
+    if comparePath:
+        with open(comparePath) as f:
+            found += regressions(json.load(f), results, threshold)
+    if "startup" in results:
+        found += startup_regressions(results["startup"])
+    for line in found:
+        print(f"REGRESSION {line}")
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()